@@ -25,6 +25,7 @@ class XMLConfig:
 
         # Initialize service-specific attributes with default values
         self.ANTI_SPOOF= False
+        self.ANTI_SPOOF_BACKEND = 'torch'
         self.FLASK_PORT = None
         self.FLASK_HOST = None
         self.FLASK_DEBUG = False
@@ -39,6 +40,16 @@ class XMLConfig:
         self.BASE_RECOG_DIR = None
         self.FACE_IMAGES_PATH = None
         self.STREAM_QUALITY_MAPPING = {}
+        self.ANN_INDEX = {}
+        self.EMBEDDING_CACHE_DIR = None
+        self.EMOTION = {}
+        self.TRACKER = {}
+        self.SCHEDULER = {}
+        self.MULTISCALE = {}
+        self.MOTION_GATE = {}
+        self.PERSISTENCE = {}
+        self.TEMPLATES = {}
+        self.UNKNOWN_VISITORS = {}
 
         # Extract service-specific configuration based on the provided service name
         if service_name:
@@ -57,13 +68,25 @@ class XMLConfig:
 
                 # Specific to face_recognition_service
                 if service_name == 'face_recognition_service':
-                    self.ANTI_SPOOF = service_config.get('anti_spoof', 'false').lower() == 'true'
+                    anti_spoof = service_config.find('anti_spoof')
+                    self.ANTI_SPOOF = (service_config.get('anti_spoof') or self._safe_find_text(service_config, 'anti_spoof') or 'false').strip().lower() == 'true'
+                    self.ANTI_SPOOF_BACKEND = anti_spoof.get('backend', 'torch') if anti_spoof is not None else 'torch'
                     self.VIDEO_FOLDER = self._safe_find_text(service_config, 'video_folder')
                     self.BASE_RECOG_DIR = self._safe_find_text(service_config, 'base_recog_dir')
                     self.FACE_IMAGES_PATH = self._safe_find_text(service_config, 'face_images_path')
                     self.LOGGING_COLLECTION = self._safe_find_text(service_config, 'logging_collection')
                     self.CAMERA_COLLECTION = self._safe_find_text(service_config, 'camera_collection')
+                    self.EMBEDDING_CACHE_DIR = self._safe_find_text(service_config, 'embedding_cache_dir')
                     self._parse_stream_quality_mapping(service_config)
+                    self._parse_ann_index(service_config)
+                    self._parse_emotion(service_config)
+                    self._parse_tracker(service_config)
+                    self._parse_scheduler(service_config)
+                    self._parse_multiscale(service_config)
+                    self._parse_motion_gate(service_config)
+                    self._parse_persistence(service_config)
+                    self._parse_templates(service_config)
+                    self._parse_unknown_visitors(service_config)
 
             else:
                 raise ValueError(f"Service '{service_name}' not found in configuration.")
@@ -92,6 +115,113 @@ class XMLConfig:
                     'compression': compression
                 }
 
+    def _parse_ann_index(self, service_config):
+        """Helper method to parse the approximate nearest-neighbour gallery index settings."""
+        ann_index = service_config.find('ann_index')
+        if ann_index is not None:
+            self.ANN_INDEX = {
+                'enabled': ann_index.get('enabled', 'false').lower() == 'true',
+                'nlist': int(ann_index.get('nlist', 1024)),
+                'nprobe': int(ann_index.get('nprobe', 32)),
+                'min_size': int(ann_index.get('min_size', 20000)),
+                'max_imbalance': float(ann_index.get('max_imbalance', 3.0)),
+                'path': ann_index.get('path', 'data/gallery_index.npz'),
+            }
+
+    def _parse_emotion(self, service_config):
+        """Helper method to parse the temporal emotion model settings."""
+        emotion = service_config.find('emotion')
+        if emotion is not None:
+            self.EMOTION = {
+                'seq_len': int(emotion.get('seq_len', 10)),
+                'stride': int(emotion.get('stride', 3)),
+                'ttl': float(emotion.get('ttl', 5.0)),
+            }
+
+    def _parse_tracker(self, service_config):
+        """Helper method to parse the per-camera face tracker settings."""
+        tracker = service_config.find('tracker')
+        if tracker is not None:
+            self.TRACKER = {
+                'iou_threshold': float(tracker.get('iou_threshold', 0.3)),
+                'max_age': int(tracker.get('max_age', 15)),
+                'refresh_interval': int(tracker.get('refresh_interval', 10)),
+                'low_confidence_margin': float(tracker.get('low_confidence_margin', 0.1)),
+            }
+
+    def _parse_scheduler(self, service_config):
+        """Helper method to parse the cross-camera inference scheduler settings."""
+        scheduler = service_config.find('scheduler')
+        if scheduler is not None:
+            self.SCHEDULER = {
+                'enabled': scheduler.get('enabled', 'false').lower() == 'true',
+                'max_batch': int(scheduler.get('max_batch', 8)),
+                'max_wait_ms': float(scheduler.get('max_wait_ms', 10)),
+            }
+
+    def _parse_multiscale(self, service_config):
+        """Helper method to parse the adaptive multi-scale detection settings."""
+        multiscale = service_config.find('multiscale')
+        if multiscale is not None:
+            self.MULTISCALE = {
+                'mode': multiscale.get('mode', 'adaptive'),
+                'live_mode': multiscale.get('live_mode', 'close_up'),
+                'low_confidence': float(multiscale.get('low_confidence', 0.9)),
+                'close_up_ratio': float(multiscale.get('close_up_ratio', 0.35)),
+                'close_up_frames': int(multiscale.get('close_up_frames', 30)),
+            }
+
+    def _parse_motion_gate(self, service_config):
+        """Helper method to parse the per-camera motion gate settings."""
+        motion_gate = service_config.find('motion_gate')
+        if motion_gate is not None:
+            self.MOTION_GATE = {
+                'enabled': motion_gate.get('enabled', 'false').lower() == 'true',
+                'width': int(motion_gate.get('width', 160)),
+                'pixel_threshold': int(motion_gate.get('pixel_threshold', 25)),
+                'min_area': float(motion_gate.get('min_area', 0.002)),
+                'force_interval': float(motion_gate.get('force_interval', 5)),
+            }
+
+    def _parse_persistence(self, service_config):
+        """Helper method to parse the background persistence worker settings."""
+        persistence = service_config.find('persistence')
+        if persistence is not None:
+            self.PERSISTENCE = {
+                'max_queue': int(persistence.get('max_queue', 1000)),
+                'batch_size': int(persistence.get('batch_size', 50)),
+                'flush_interval': float(persistence.get('flush_interval', 1.0)),
+            }
+
+    def _parse_templates(self, service_config):
+        """Helper method to parse the multi-template identity settings."""
+        templates = service_config.find('templates')
+        if templates is not None:
+            self.TEMPLATES = {
+                'max_per_identity': int(templates.get('max_per_identity', 1)),
+                'aggregate': templates.get('aggregate', 'max'),
+                'redundant_similarity': float(templates.get('redundant_similarity', 0.9)),
+                'harvest': templates.get('harvest', 'false').lower() == 'true',
+                'harvest_similarity': float(templates.get('harvest_similarity', 0.6)),
+                'min_margin': float(templates.get('min_margin', 0.1)),
+                'min_det_score': float(templates.get('min_det_score', 0.8)),
+                'min_face_size': int(templates.get('min_face_size', 80)),
+                'harvest_interval': float(templates.get('harvest_interval', 30)),
+            }
+
+    def _parse_unknown_visitors(self, service_config):
+        """Helper method to parse the unknown visitor clustering settings."""
+        unknown_visitors = service_config.find('unknown_visitors')
+        if unknown_visitors is not None:
+            self.UNKNOWN_VISITORS = {
+                'enabled': unknown_visitors.get('enabled', 'false').lower() == 'true',
+                'max_visitors': int(unknown_visitors.get('max_visitors', 1000)),
+                'threshold': float(unknown_visitors.get('threshold', 0.5)),
+                'ttl': float(unknown_visitors.get('ttl', 3600)),
+                'visit_gap': float(unknown_visitors.get('visit_gap', 300)),
+                'min_face_size': int(unknown_visitors.get('min_face_size', 40)),
+            }
+
     def get_jwt_expire_timedelta(self):
         return timedelta(seconds=self.JWT_EXPIRE_SECONDS)
 
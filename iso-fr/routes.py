@@ -4,6 +4,8 @@ import base64
 import glob
 import shutil
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 import bson
 import bson.json_util
@@ -12,6 +14,7 @@ import flask.json.provider as provider
 from pymongo import DESCENDING, MongoClient
 # from services.camera_processor.Stream import Stream
 from services.camera_processor.StreamR import Stream
+from services.camera_processor.regions import CameraRegions
 from logger import configure_logging
 from flask_cors import CORS
 from flask_jwt_extended import jwt_required, JWTManager
@@ -63,7 +66,7 @@ logs_collection = db[xml_config.LOGGING_COLLECTION if xml_config.LOGGING_COLLECT
 camera_collection = db[xml_config.CAMERA_COLLECTION if xml_config.CAMERA_COLLECTION else 'cameras']
 
 # Create instances
-stream_instance = Stream(device= xml_config.DEVICE if xml_config.DEVICE else 'cpu', anti_spoof=xml_config.ANTI_SPOOF)
+stream_instance = Stream(device= xml_config.DEVICE if xml_config.DEVICE else 'cpu', anti_spoof=xml_config.ANTI_SPOOF, ann_index=xml_config.ANN_INDEX, embedding_cache_dir=xml_config.EMBEDDING_CACHE_DIR or "data/embeddings", emotion=xml_config.EMOTION, tracker=xml_config.TRACKER, anti_spoof_backend=xml_config.ANTI_SPOOF_BACKEND, scheduler=xml_config.SCHEDULER, motion_gate=xml_config.MOTION_GATE, persistence=xml_config.PERSISTENCE, templates=xml_config.TEMPLATES, unknown_visitors=xml_config.UNKNOWN_VISITORS, multiscale=xml_config.MULTISCALE)
 # logger = configure_logging()
 
 # Setup Blueprint
@@ -150,6 +153,13 @@ def add_camera_url():
     if not label or not url:
         return jsonify({"error": "Label and URL are required"}), 400
     camera = {"label": label, "url": url}
+    if data.get("roi") or data.get("exclusions"):
+        try:
+            CameraRegions(data.get("roi"), data.get("exclusions"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        camera["roi"] = data.get("roi")
+        camera["exclusions"] = data.get("exclusions") or []
     result = camera_collection.insert_one(camera)
     camera["_id"] = str(result.inserted_id)
     notify_new_camera_url(camera=camera)
@@ -187,6 +197,29 @@ def update_camera_url(label):
 
     return jsonify({"message": "Camera URL updated successfully"}), 200
 
+@camera_bp.route("/camera-url/<label>/regions", methods=["PUT"])
+# @jwt_required()
+def update_camera_regions(label):
+    """Set the ROI polygon and exclusion polygons (normalized [x, y] points) of a camera."""
+    data = request.json or {}
+    roi = data.get("roi")
+    exclusions = data.get("exclusions") or []
+    try:
+        regions = CameraRegions(roi, exclusions)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = camera_collection.update_one(
+        {"label": label}, {"$set": {"roi": roi, "exclusions": exclusions}}
+    )
+
+    if result.matched_count == 0:
+        return jsonify({"error": "Camera label not found"}), 404
+
+    # Running streams pick the new regions up on their next frame
+    stream_instance.set_camera_regions(label, regions)
+    return jsonify({"message": "Camera regions updated successfully"}), 200
+
 @camera_bp.route("/stream/<int:stream_id>", methods=["GET"])
 # @jwt_required()
 def stream(stream_id):
@@ -194,6 +227,10 @@ def stream(stream_id):
     camera = request.args.get("camera")
     camera_name = request.args.get("cameraName")
     quality = request.args.get("streamProfile")
+    # Per-viewer delivery settings; they do not change the analysis rate
+    max_fps = request.args.get("max_fps", type=float)
+    max_width = request.args.get("max_width", type=int)
+    jpeg_quality = request.args.get("jpeg_quality", type=int)
 
     print(f"------------- Route-Camera: {camera}")
     print(f"------------- Route-Quality: {quality}")
@@ -206,18 +243,31 @@ def stream(stream_id):
     if quality in quality_mapping:
         query_params["resolution"] = [quality_mapping[quality]["resolution"]]
         query_params["compression"] = [quality_mapping[quality]["compression"]]
+        # The camera pipeline is shared across profiles, so the profile also caps this viewer's width
+        try:
+            profile_width = int(quality_mapping[quality]["resolution"].lower().split("x")[0])
+            max_width = min(max_width, profile_width) if max_width else profile_width
+        except (AttributeError, ValueError):
+            pass
 
     new_query_string = urlencode(query_params, doseq=True)
     new_camera_url = urlunparse(parsed_url._replace(query=new_query_string))
 
     print(f"------------- Updated Camera URL: {new_camera_url}")
 
+    stream_instance.set_camera_regions(
+        camera_name, CameraRegions.from_document(camera_collection.find_one({"label": camera_name}))
+    )
+
     return Response(
         stream_instance.recog_face_ip_cam(
             stream_id,
             camera=new_camera_url,
             camera_name=camera_name,
             is_recording=is_recording,
+            max_fps=max_fps,
+            max_width=max_width,
+            jpeg_quality=jpeg_quality,
         ),
         mimetype="multipart/x-mixed-replace; boundary=frame",
     )
@@ -232,6 +282,17 @@ def stop_stream(stream_id):
     stream_instance.stop_stream(stream_id)
     return jsonify({"message": "Stream stopped successfully"}), 200
 
+@camera_bp.route("/stream/stats", methods=["GET"])
+def all_stream_stats():
+    return jsonify(stream_instance.get_stream_stats()), 200
+
+@camera_bp.route("/stream/stats/<int:stream_id>", methods=["GET"])
+def stream_stats(stream_id):
+    stats = stream_instance.get_stream_stats(stream_id)
+    if stats is None:
+        return jsonify({"error": "Stream is not running"}), 404
+    return jsonify(stats), 200
+
 # Local CAM Stream
 @socketio.on('join')
 def on_join(data):
@@ -245,6 +306,30 @@ def on_leave(data):
     leave_room(room)
     emit('left', {'room': room}, room=room)
 
+# JPEG decoding/encoding of local camera messages runs in parallel (cv2 releases the GIL)
+frame_codec_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="frame-codec")
+
+
+def _decode_frame(frame_data):
+    # Binary attachments arrive as raw JPEG bytes, older clients send base64 data URLs
+    try:
+        if isinstance(frame_data, str):
+            frame_data = base64.b64decode(frame_data.split(',')[-1])
+        return cv2.imdecode(np.frombuffer(frame_data, np.uint8), cv2.IMREAD_COLOR)
+    except (ValueError, TypeError, cv2.error) as e:
+        print(f"Could not decode frame: {e}")
+        return None
+
+
+def _encode_frame(frame, binary):
+    if frame is None:
+        return b"" if binary else ""
+    _, buffer = cv2.imencode(".jpg", frame)
+    if binary:
+        return buffer.tobytes()
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer).decode('utf-8')
+
+
 @socketio.on('video_frames')
 def handle_video_frames(data):
     room = data['room']
@@ -252,8 +337,8 @@ def handle_video_frames(data):
     frames_data = data['frames']
     camera_name = data['cameraName']
     is_recording = data['isRecording']
-
-    processed_frames = []
+    # Answer binary frames with binary frames unless the client asks otherwise
+    binary = data.get('binary', bool(frames_data) and isinstance(frames_data[0], (bytes, bytearray)))
     # stream_instance.fetch_personnel_records()
     # url = "http://utils_service:5004/personel"
     # try:
@@ -268,15 +353,24 @@ def handle_video_frames(data):
     # except requests.exceptions.RequestException as e:
     #     print(f"An error occurred: {e}")
 
-    for frame_data in frames_data:
-        image_data = frame_data.split(',')[1]
-        nparr = np.frombuffer(base64.b64decode(image_data), np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        processed_image = stream_instance.recog_face_local_cam(stream_id, frame, camera_name, is_recording)
-        processed_frames.append(processed_image)
-
-    emit('processed_frames', {'frames': processed_frames}, room=room)
+    start = time.perf_counter()
+    frames = list(frame_codec_pool.map(_decode_frame, frames_data))
+    decoded = time.perf_counter()
+    processed = stream_instance.recog_face_local_cam_batch(stream_id, frames, camera_name, is_recording)
+    analyzed = time.perf_counter()
+    processed_frames = list(frame_codec_pool.map(_encode_frame, processed, [binary] * len(processed)))
+    encoded = time.perf_counter()
+
+    timing = {
+        'frames': len(frames_data),
+        'decode_ms': round((decoded - start) * 1000, 1),
+        'process_ms': round((analyzed - decoded) * 1000, 1),
+        'encode_ms': round((encoded - analyzed) * 1000, 1),
+        'total_ms': round((encoded - start) * 1000, 1),
+        'bytes_in': sum(len(frame_data) for frame_data in frames_data),
+        'bytes_out': sum(len(frame) for frame in processed_frames),
+    }
+    emit('processed_frames', {'frames': processed_frames, 'timing': timing}, room=room)
 
 @app.route('/local_stream/stop_recording/<int:stream_id>', methods=['POST'])
 def stop_recording(stream_id):
@@ -302,6 +396,18 @@ def update_database_with_id():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@camera_bp.route("/remove_from_database_with_id", methods=["POST"])
+def remove_from_database_with_id():
+    data = request.json
+    personnel_id = data.get('personnel_id')
+
+    if not personnel_id:
+        return jsonify({"status": "error", "message": "personnel_id is required"}), 400
+
+    if not stream_instance.remove_personnel(personnel_id):
+        return jsonify({"status": "error", "message": f"No embedding found for {personnel_id}"}), 404
+    return jsonify({"status": "success", "message": f"Embedding removed for {personnel_id}"}), 200
+
 @camera_bp.route("/recog", methods=["GET"])
 def get_all_logs_by_date():
     date_str = request.args.get('date')
@@ -12,6 +12,7 @@ import onnxruntime
 from services.camera_processor.scrfd import SCRFD
 from services.camera_processor.arcface_onnx import ArcFaceONNX
 from services.camera_processor.attribute import Attribute
+from services.camera_processor.gallery import FaceGallery
 from services.camera_processor.emotion import EmotionDetector
 from socketio_instance import notify_new_face
 import subprocess
@@ -24,6 +25,8 @@ import os
 from services.camera_processor.anti_spoof_predict import AntiSpoofPredict
 from services.camera_processor.generate_patches import CropImage
 from services.camera_processor.utility import parse_model_name
+from services.camera_processor.persistence import PersistenceWorker
+from services.camera_processor.personnel_cache import PersonnelCache
 # Unset proxy environment variables
 os.environ.pop('HTTP_PROXY', None)
 os.environ.pop('HTTPS_PROXY', None)
@@ -69,8 +72,11 @@ class Stream:
         client = MongoClient(os.getenv("MONGO_DB_URI"))
         self.db = client["isoai"]
         self.recognition_logs_collection = self.db["logs"]
+        self.persistence = PersistenceWorker(self.recognition_logs_collection, notify=notify_new_face)
+        # Names of recognized personnel; filled from the roster, refreshed in the background
+        self.personnel_cache = PersonnelCache("http://utils_service:5004/personel")
         
-        self.database: Dict[str, np.ndarray] = {}
+        self.database = FaceGallery()
         self.create_face_database(
             # self.face_recognizer,
             # self.face_detector,
@@ -157,6 +163,7 @@ class Stream:
             response = requests.get(url, proxies={"http": None, "https": None})
             response.raise_for_status()  # Raise an HTTPError for bad responses
             personnel_records = response.json()
+            self.personnel_cache.prime(personnel_records)
             
             print("Personnel Records:")
             for record in personnel_records:
@@ -186,7 +193,7 @@ class Stream:
                             embedding = self.face_recognizer.get(image, kps)
                             key = f"{record['_id']}"
                             # key = f"{record['name']}_{record['lastname']}"
-                            self.database[key] = embedding
+                            self.database.add(key, embedding)
                             print(f"Embedding saved for {key}")
                     except requests.exceptions.RequestException as e:
                         print(f"An error occurred while fetching the image: {e}")
@@ -203,6 +210,9 @@ class Stream:
             response = requests.get(personnel_url, proxies={"http": None, "https": None})
             response.raise_for_status()  # Raise an HTTPError for bad responses
             personnel_record = response.json()
+            # Recognitions pick up the updated name immediately
+            self.personnel_cache.invalidate(personnel_id)
+            self.personnel_cache.put(personnel_id, personnel_record)
             
             print("Personnel Record:")
             print(personnel_record)
@@ -228,7 +238,7 @@ class Stream:
                         kps = kpss[0]
                         embedding = self.face_recognizer.get(image, kps)
                         key = personnel_id
-                        self.database[key] = embedding
+                        self.database.add(key, embedding)
                         print(f"Embedding saved for {key}")
                 except requests.exceptions.RequestException as e:
                     print(f"An error occurred while fetching the image: {e}")
@@ -285,7 +295,7 @@ class Stream:
         # Check if the old_name exists in the database
         if old_name in self.database:
             # Update the key with the new_name
-            self.database[new_name] = self.database.pop(old_name)
+            self.database.rename(old_name, new_name)
             print(f"Database key updated from {old_name} to {new_name}")
         else:
             print(f"No entry found for {old_name} in the database.")
@@ -302,13 +312,13 @@ class Stream:
                 break
 
         if new_image_path:
-            if self.database.get(new_name) is None:
+            if new_name not in self.database:
                 image = cv2.imread(new_image_path)
                 bboxes, kpss = self.face_detector.detect(image, input_size=(640,640), max_num=1)
                 if len(bboxes) > 0:
                     kps = kpss[0]
                     embedding = self.face_recognizer.get(image, kps)
-                    self.database[new_name] = embedding
+                    self.database.add(new_name, embedding)
                     print(f"Database updated with new embedding for {new_name}")
                 else:
                     print("No face detected in the new image.")
@@ -335,28 +345,13 @@ class Stream:
         filename_timestamp = now.strftime("%Y%m%d-%H%M%S")
         filename = f"{label}-{filename_timestamp}.jpg"
         base_dir = self.known_faces_dir if is_known else self.unknown_faces_dir
-        person_dir = os.path.join(base_dir, label)
-        os.makedirs(person_dir, exist_ok=True)
-        file_path = os.path.join(person_dir, filename)
+        file_path = os.path.join(base_dir, label, filename)
         print(f"Saving face image to: {file_path}")
 
-        try:
-            success = cv2.imwrite(file_path, face_image)
-            if not success:
-                print("Error: Failed to save the image.")
-                return "Error: Failed to save image"
-        except cv2.error as e:
-            print(f"OpenCV error: {e}")
-            return f"Error: OpenCV error - {e}"
-        except PermissionError as e:
-            print(f"Permission error: {e}")
-            return f"Error: Permission error - {e}"
-        except FileNotFoundError as e:
-            print(f"File not found error: {e}")
-            return f"Error: File not found error - {e}"
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return f"Error: Unexpected error - {e}"
+        # Encoded and written by the persistence worker; the frame keeps being drawn on, so queue a copy
+        if not self.persistence.save_image(file_path, face_image.copy()):
+            print("Error: Persistence queue is full, face image not saved.")
+            return "Error: Persistence queue full"
 
         log_record = {
             "timestamp": timestamp,
@@ -371,8 +366,7 @@ class Stream:
         }
 
         if is_known:
-            notify_new_face(log_record)
-            self.recognition_logs_collection.insert_one(log_record)
+            self.persistence.log(log_record)
 
         return file_path
     def _get_attributes(
@@ -388,54 +382,43 @@ class Stream:
         if len(bboxes) == 0:
             return [], [], [], [], [], []
 
-        labels, sims, emotions, ages, genders = [], [], [], [], []
-
-        for idx, kps in enumerate(kpss):
-            bbox = bboxes[idx]
-            x1, y1, x2, y2 = map(int, bbox[:4])
-
-            # Perform anti-spoofing check
+        # Perform anti-spoofing check
+        live_indices = []
+        for idx, bbox in enumerate(bboxes):
             if self.anti_spoof:
                 processed_frame, spoofing_label, spoofing_score, _ = self._perform_anti_spoofing_check(frame, bbox)
 
                 # If the face is detected as fake, continue to the next detected face
                 if spoofing_label != 1 or spoofing_score < 0.5:
-                    # print(f"Fake face detected with score: {spoofing_score:.2f}, skipping further processing.")
-                    # cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)  # Draw red box
                     frame = processed_frame
                     continue
+            live_indices.append(idx)
+        if not live_indices:
+            return [], [], [], [], [], []
+        bboxes, kpss = bboxes[live_indices], kpss[live_indices]
+
+        # Perform face recognition and match every face against the gallery at once
+        embeddings = np.stack([self.face_recognizer.get(frame, kps) for kps in kpss])
+        match_keys, match_scores = self.database.match(embeddings)
 
-            # Perform face recognition
-            embedding = self.face_recognizer.get(frame, kps)
-            min_dist = float("inf")
-            best_match = None
+        labels, sims, emotions, ages, genders = [], [], [], [], []
+
+        for idx, bbox in enumerate(bboxes):
+            x1, y1, x2, y2 = map(int, bbox[:4])
+            best_match = match_keys[idx][0]
+            sim = float(match_scores[idx, 0])
             label = "Unknown"
             is_known = False
             personnel_id = None
 
-            # Match the face embedding with the database
-            for id, db_embedding in self.database.items():
-                dist = np.linalg.norm(db_embedding - embedding)
-                if dist < min_dist:
-                    min_dist = dist
-                    best_match = id
-
-            sim = self.face_recognizer.compute_sim(embedding, self.database.get(best_match, np.zeros_like(embedding)))
-            if sim >= self.similarity_threshold:
-                try:
-                    personnel_id = best_match
-                    url = f"http://utils_service:5004/personel/{personnel_id}"
-                    response = requests.get(url, proxies={"http": None, "https": None})
-                    response.raise_for_status()
-                    person = response.json()
-                    if person and "name" in person and "lastname" in person:
-                        label = f"{person['name']} {person['lastname']}"
-                        is_known = True
-                    else:
-                        label = best_match
-                        is_known = False
-                except requests.exceptions.RequestException as e:
-                    print(f"An error occurred while fetching personnel details: {e}")
+            if best_match is not None and sim >= self.similarity_threshold:
+                personnel_id = best_match
+                # Never blocks: unknown or expired ids are fetched in the background
+                person = self.personnel_cache.get(personnel_id)
+                if person is not None:
+                    label = f"{person['name']} {person['lastname']}"
+                    is_known = True
+                else:
                     label = best_match
                     is_known = False
 
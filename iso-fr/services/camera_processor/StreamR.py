@@ -9,19 +9,30 @@ import numpy as np
 from pymongo import MongoClient
 import torch
 import onnxruntime
-from services.camera_processor.scrfd import SCRFD
+from services.camera_processor.scrfd import SCRFD, MultiScalePolicy
 from services.camera_processor.arcface_onnx import ArcFaceONNX
 from services.camera_processor.attribute import Attribute
-from services.camera_processor.emotion_restnet import ResNet, ResNet50, LSTMPyTorch, pth_processing
+from services.camera_processor.gallery import FaceGallery
+from services.camera_processor.ann_index import IVFIndex
+from services.camera_processor.embedding_store import EmbeddingStore, content_hash, file_hash
+from services.camera_processor.emotion_restnet import ResNet, ResNet50, LSTMPyTorch
+from services.camera_processor.emotion_state import EmotionTemporalState
+from services.camera_processor.tracker import FaceTracker
+from services.camera_processor.frame_reader import LatestFrameReader
+from services.camera_processor.camera_hub import CameraHub, CameraPipeline, StreamViewer
+from services.camera_processor.inference_scheduler import InferenceScheduler
+from services.camera_processor.motion_gate import MotionGate
+from services.camera_processor.regions import CameraRegions
+from services.camera_processor.persistence import PersistenceWorker
+from services.camera_processor.aggregator import RecognitionAggregator
+from services.camera_processor.unknown_visitors import UnknownVisitorStore
 from socketio_instance import notify_new_face
 import subprocess
 import time
 import requests
 import os
 from services.camera_processor.anti_spoof_predict import AntiSpoofPredict
-from services.camera_processor.generate_patches import CropImage
-from services.camera_processor.utility import parse_model_name
-from collections import defaultdict
+from services.camera_processor.anti_spoof_onnx import AntiSpoofONNX
 from PIL import Image   
 # Unset proxy environment variables
 os.environ.pop('HTTP_PROXY', None)
@@ -31,7 +42,7 @@ DICT_EMO = {0: 'Neutral', 1: 'Happiness', 2: 'Sadness', 3: 'Surprise', 4: 'Fear'
 # from flask import jsonify
 # import requests
 class Stream:
-    def __init__(self, device: str = "cuda", anti_spoof: bool = False) -> None:
+    def __init__(self, device: str = "cuda", anti_spoof: bool = False, ann_index: Dict = None, embedding_cache_dir: str = "data/embeddings", emotion: Dict = None, tracker: Dict = None, anti_spoof_backend: str = "torch", scheduler: Dict = None, motion_gate: Dict = None, persistence: Dict = None, templates: Dict = None, unknown_visitors: Dict = None, multiscale: Dict = None) -> None:
         self.device = torch.device(device)
         onnxruntime.set_default_logger_severity(3)  # 3: INFO, 2: WARNING, 1: ERROR
         onnx_models_dir = os.path.abspath(os.path.join(__file__, "../../models/buffalo_l"))
@@ -41,6 +52,10 @@ class Stream:
         face_detector_model = os.path.join(onnx_models_dir, "det_10g.onnx")
         self.face_detector = SCRFD(face_detector_model)
         self.face_detector.prepare(0)
+        # Live frames get one 640x640 pass; the 128x128 pass only follows a recent close-up face
+        multiscale = dict(multiscale or {})
+        multiscale["mode"] = multiscale.pop("live_mode", "close_up")
+        self.face_detector.multiscale = MultiScalePolicy(**{"thresh": 0.7, **multiscale})
         # self.face_detector.prepare(0 if device == "cuda" else -1)
         
         # Face Recognition
@@ -69,20 +84,52 @@ class Stream:
         self.emotion_lstm_model.load_state_dict(torch.load(os.path.join(emotion_models_dir, "FER_dinamic_LSTM_Aff-Wild2.pt"),  weights_only=True, map_location=device))
         self.emotion_lstm_model.eval()
 
+        emotion = emotion or {}
+        self.emotion_state = EmotionTemporalState(
+            self.emotion_backbone_model,
+            self.emotion_lstm_model,
+            self.device,
+            seq_len=emotion.get("seq_len", 10),
+            stride=emotion.get("stride", 3),
+            ttl=emotion.get("ttl", 5.0),
+        )
+
         # Anti-Spoofing
         # anti_spoofing_model_path="../models/anti_spoof_models/2.7_80x80_MiniFASNetV2.pth"
         self.anti_spoof = anti_spoof
         if self.anti_spoof:
             self.anti_spoofing_model_path = "/app/services/models/anti_spoof_models/"
-            self.anti_spoof_predictor = AntiSpoofPredict(self.anti_spoofing_model_path, face_detector_model)
-            self.image_cropper = CropImage()
+            # Every MiniFASNet variant in the directory is loaded once, here
+            if anti_spoof_backend == "onnx":
+                # .onnx files exported with services.camera_processor.anti_spoof_onnx
+                self.anti_spoof_predictor = AntiSpoofONNX(self.anti_spoofing_model_path)
+            else:
+                self.anti_spoof_predictor = AntiSpoofPredict(0, model_dir=self.anti_spoofing_model_path)
+            print(f"Anti-spoofing models loaded: {self.anti_spoof_predictor.model_names}")
         # MongoDB
         client = MongoClient(os.getenv("MONGO_DB_URI"))
         self.db = client["isoai"]
         self.recognition_logs_collection = self.db["logs"]
+        # Face images and log records are written by a background worker, never by the frame loop
+        self.persistence = PersistenceWorker(self.recognition_logs_collection, notify=notify_new_face, **(persistence or {}))
         
-        self.database: Dict[str, Dict[str, np.ndarray]] = {}
+        # Enrollment embeddings survive restarts; a model change invalidates them
+        self.http_session = requests.Session()
+        self.http_session.trust_env = False
+        self.embedding_store = EmbeddingStore(embedding_cache_dir, file_hash([face_detector_model, face_rec_model]))
+        # Each person is matched against their enrollment photo plus harvested camera crops
+        templates = templates or {}
+        self.template_config = templates
+        self.last_harvest: Dict[str, float] = {}
+        self.database = FaceGallery(
+            max_templates=templates.get("max_per_identity", 1),
+            aggregate=templates.get("aggregate", "max"),
+            redundant_similarity=templates.get("redundant_similarity", 0.9),
+        )
+        self.ann_index_path = None
+        self._ann_index_lock = threading.Lock()
         self.create_face_database()
+        self._setup_ann_index(ann_index or {})
         
         # Face Recognition Image Directories
         self.known_faces_dir: str = "recog/known_faces"
@@ -93,78 +140,165 @@ class Stream:
 
         self.stop_flags = {}  # Dictionary to hold stop flags for each camera
         self.video_writers = {}
+        # One pipeline per camera URL, shared by every viewer (stream id) watching it
+        self.camera_hub = CameraHub()
+        self.stream_pipelines: Dict[int, CameraPipeline] = {}
+        self.stream_viewers: Dict[int, StreamViewer] = {}
+        self.stream_readers: Dict[str, LatestFrameReader] = {}  # Capture thread per running pipeline
+        # Skip detection on IP camera frames where nothing moved
+        self.motion_gate_config = dict(motion_gate or {})
+        self.motion_gate_enabled = self.motion_gate_config.pop("enabled", False)
+        self.motion_gates: Dict[str, MotionGate] = {}
+        # One face tracker per camera
+        self.tracker_config = tracker or {}
+        self.trackers: Dict[str, FaceTracker] = {}
+        self._trackers_lock = threading.Lock()
+        # ROI / exclusion polygons per camera, from the cameras collection
+        self.camera_regions: Dict[str, CameraRegions] = {}
+
+        # Faces that match nobody are clustered into unknown-<n> visitors, logged once per visit
+        unknown_visitors = dict(unknown_visitors or {})
+        self.unknown_min_face_size = unknown_visitors.pop("min_face_size", 40)
+        self.unknown_visitors = UnknownVisitorStore(**unknown_visitors) if unknown_visitors.pop("enabled", False) else None
+
+        # Sightings of each identity are aggregated into one log record per 60 seconds
+        self.aggregator = RecognitionAggregator(self.persistence.log_many, window=60.0)
+
+        # Frames from all streams share micro-batched model calls
+        scheduler = scheduler or {}
+        self.scheduler = None
+        if scheduler.get("enabled"):
+            self.scheduler = InferenceScheduler(
+                self._analyze_frames,
+                max_batch=scheduler.get("max_batch", 8),
+                max_wait_ms=scheduler.get("max_wait_ms", 10.0),
+            )
+
+    def _align_personnel_image(self, image_bytes: bytes):
+        # Process the image to get the aligned face crop
+        image_array = np.frombuffer(image_bytes, np.uint8)
+        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        image = cv2.copyMakeBorder(
+            image, 
+            640, 640, 640, 640, 
+            cv2.BORDER_CONSTANT, 
+            value=[255, 255, 255]
+        )
+        bboxes, kpss = self.face_detector.detect(image, input_size=(640,640), thresh=0.5, max_num=1)
+        if len(bboxes) == 0:
+            return None
+        return self.face_recognizer.align(image, kpss[0])
+
+    def _refresh_personnel_embedding(self, user_id: str, label: str, image_url: str):
+        """
+        Bring one person's embedding up to date from the cache when the photo is unchanged.
+        Otherwise return ``(user_id, label, image_hash, etag, aligned_face)`` for ``_embed_pending``.
+        """
+        cached = self.embedding_store.get(user_id)
+        headers = {}
+        if cached is not None and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        image_response = self.http_session.get(image_url, headers=headers)
+        if image_response.status_code == 304 and cached is not None:
+            self.embedding_store.update_metadata(user_id, label=label)
+            self.database.add(user_id, cached["embedding"], label)
+            return None
+        image_response.raise_for_status()
+        etag = image_response.headers.get("ETag")
+        image_hash = content_hash(image_response.content)
+        if cached is not None and cached["image_hash"] == image_hash:
+            self.embedding_store.update_metadata(user_id, label=label, etag=etag)
+            self.database.add(user_id, cached["embedding"], label)
+            return None
+        aligned_face = self._align_personnel_image(image_response.content)
+        if aligned_face is None:
+            print(f"No face found in the photo of {user_id}")
+            return None
+        return user_id, label, image_hash, etag, aligned_face
+
+    def _embed_pending(self, pending: List[tuple]) -> int:
+        # One batched recognition pass for all photos that changed
+        if not pending:
+            return 0
+        embeddings = self.face_recognizer.get_feat([aligned_face for *_, aligned_face in pending])
+        for (user_id, label, image_hash, etag, _), embedding in zip(pending, embeddings):
+            self.embedding_store.put(user_id, embedding, label, image_hash, etag)
+            self.database.add(user_id, embedding, label)
+            # Crops harvested against the previous photo no longer vouch for this one
+            self.database.clear_templates(user_id)
+            print(f"Embedding saved for {user_id}")
+        return len(pending)
 
-        # Store recognition data for each personnel_id to aggregate data over 60 seconds
-        self.recognition_data = defaultdict(lambda: {
-            "timestamps": [],
-            "label": None, 
-            "similarities": [],
-            "emotion_scores": defaultdict(list),
-            "genders": [],
-            "ages": [],
-            "image_path": None,
-            "camera_name": None,
-            "personnel_id": None
-        })
-        self._start_background_saver()
     def create_face_database(self) -> Dict[str, np.ndarray]:
         # url = "http://localhost:5004/personel"
         url = "http://utils_service:5004/personel"
         # image_url_template = "http://localhost:5004/personel/image/?id={user_id}"
         image_url_template = "http://utils_service:5004/personel/image/?id={user_id}"
-        
+
+        # Serve cached embeddings right away; the roster below only reconciles them
+        cached_count = self.embedding_store.load()
+        for user_id in self.embedding_store.ids():
+            cached = self.embedding_store.get(user_id)
+            self.database.add(user_id, cached["embedding"], cached["label"])
+        print(f"Loaded {cached_count} cached embeddings")
+
+        # Cameras start on the cached gallery; the roster is reconciled in the background
+        self.roster_thread = threading.Thread(
+            target=self._reconcile_roster, args=(url, image_url_template, set(self.embedding_store.ids())),
+            name="roster-reconcile", daemon=True,
+        )
+        self.roster_thread.start()
+
+    def _reconcile_roster(self, url: str, image_url_template: str, cached_ids: set) -> None:
+        """Bring the gallery and the embedding store in line with the utils service roster."""
         try:
-            # Disable proxy for this request
-            response = requests.get(url, proxies={"http": None, "https": None})
+            response = self.http_session.get(url)
             response.raise_for_status()  # Raise an HTTPError for bad responses
             personnel_records = response.json()
-            
-            print("Personnel Records:")
-            for record in personnel_records:
-                print("---------Personnel Record---------")
-                print(record)
-                
-                # Retrieve the image
-                user_id = record.get('_id')
-                if user_id:
-                    try:
-                        # Personel Label
-                        label = f"{record['name']} {record['lastname']}"
-                        
-                        image_url = image_url_template.format(user_id=user_id)
-                        image_response = requests.get(image_url, proxies={"http": None, "https": None})
-                        image_response.raise_for_status()
-                        
-                        # Process the image to get the embedding
-                        image_array = np.frombuffer(image_response.content, np.uint8)
-                        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-                        image = cv2.copyMakeBorder(
-                            image, 
-                            640, 640, 640, 640, 
-                            cv2.BORDER_CONSTANT, 
-                            value=[255, 255, 255]
-                        )
-                        bboxes, kpss = self.face_detector.detect(image, input_size=(640,640), thresh=0.5, max_num=1)
-                        if len(bboxes) > 0:
-                            kps = kpss[0]
-                            embedding = self.face_recognizer.get(image, kps)
-                            key = f"{record['_id']}"
-                            # key = f"{record['name']}_{record['lastname']}"
-                            self.database[key] = {"embedding": embedding, "label": label}
-                            print(f"Embedding saved for {key}")
-                    except requests.exceptions.RequestException as e:
-                        print(f"An error occurred while fetching the image: {e}")
-                else:
-                    print("No user ID found for this record.")
         except requests.exceptions.RequestException as e:
             print(f"An error occurred: {e}")
+            return
+
+        embedded = 0
+        pending = []
+        current_ids = set()
+        for record in personnel_records:
+            user_id = record.get('_id')
+            if not user_id:
+                print("No user ID found for this record.")
+                continue
+            current_ids.add(user_id)
+            # Personel Label
+            label = f"{record['name']} {record['lastname']}"
+            try:
+                stale = self._refresh_personnel_embedding(user_id, label, image_url_template.format(user_id=user_id))
+            except requests.exceptions.RequestException as e:
+                print(f"An error occurred while fetching the image: {e}")
+                continue
+            if stale is not None:
+                pending.append(stale)
+            if len(pending) >= self.face_recognizer.batch_size:
+                embedded += self._embed_pending(pending)
+                pending = []
+        embedded += self._embed_pending(pending)
+
+        # People deleted while the service was down; ids enrolled since startup are left alone
+        for user_id in cached_ids - current_ids:
+            self.embedding_store.delete(user_id)
+            self.database.remove(user_id)
+        self.embedding_store.flush()
+        self._save_ann_index()
+        print(f"Face database ready: {len(self.database)} people, {embedded} newly embedded")
+
     def update_database_with_personnel_id(self, personnel_id: str) -> None:
         personnel_url = f"http://utils_service:5004/personel/{personnel_id}"
-        image_url_template = f"http://utils_service:5004/personel/image/?id={personnel_id}"
+        image_url = f"http://utils_service:5004/personel/image/?id={personnel_id}"
         
         try:
             # Fetch personnel record
-            response = requests.get(personnel_url, proxies={"http": None, "https": None})
+            response = self.http_session.get(personnel_url)
             response.raise_for_status()  # Raise an HTTPError for bad responses
             personnel_record = response.json()
             
@@ -176,55 +310,70 @@ class Stream:
                 try:
                     # Personnel Label
                     label = f"{personnel_record['name']} {personnel_record['lastname']}" 
-                    
-                    image_url = image_url_template.format(user_id=personnel_id)
-                    image_response = requests.get(image_url, proxies={"http": None, "https": None})
-                    image_response.raise_for_status()
-                    
-                    # Process the image to get the embedding
-                    image_array = np.frombuffer(image_response.content, np.uint8)
-                    image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-                    image = cv2.copyMakeBorder(
-                        image, 
-                        640, 640, 640, 640, 
-                        cv2.BORDER_CONSTANT, 
-                        value=[255, 255, 255]
-                    )
-                    bboxes, kpss = self.face_detector.detect(image, input_size=(640,640), thresh=0.5, max_num=1)
-                    if len(bboxes) > 0:
-                        kps = kpss[0]
-                        embedding = self.face_recognizer.get(image, kps)
-                        key = personnel_id
-                        self.database[key] = {"embedding": embedding, "label": label}
-                        print(f"Embedding saved for {key}")
+                    stale = self._refresh_personnel_embedding(personnel_id, label, image_url)
+                    if stale is not None:
+                        self._embed_pending([stale])
+                    self.embedding_store.flush()
+                    self._save_ann_index()
                 except requests.exceptions.RequestException as e:
                     print(f"An error occurred while fetching the image: {e}")
             else:
                 print("Personnel record not found.")
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                # The person was deleted in utils_service, so forget their embedding too
+                self.remove_personnel(personnel_id)
+            print(f"An error occurred: {e}")
         except requests.exceptions.RequestException as e:
             print(f"An error occurred: {e}")
 
+    def remove_personnel(self, personnel_id: str) -> bool:
+        removed = self.database.remove(personnel_id)
+        if self.embedding_store.delete(personnel_id):
+            self.embedding_store.flush()
+        if removed:
+            self._save_ann_index()
+            print(f"Embedding removed for {personnel_id}")
+        return removed
+
+    def _setup_ann_index(self, ann_config: Dict) -> None:
+        if not ann_config.get("enabled"):
+            return
+        self.ann_index_path = ann_config["path"]
+        index = None
+        if os.path.exists(self.ann_index_path):
+            try:
+                index = IVFIndex.load(self.ann_index_path, nprobe=ann_config["nprobe"])
+                print(f"ANN index loaded from {self.ann_index_path} with {len(index)} entries")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load ANN index from {self.ann_index_path}: {e}")
+        if index is None:
+            index = IVFIndex(nlist=ann_config["nlist"], nprobe=ann_config["nprobe"])
+        # Reconciles the loaded index with the current roster (incremental adds/removes)
+        self.database.attach_index(index, min_size=ann_config["min_size"], max_imbalance=ann_config["max_imbalance"])
+        self._save_ann_index()
+
+    def _save_ann_index(self) -> None:
+        index = self.database.index
+        if index is None or self.ann_index_path is None or not index.is_trained:
+            return
+
+        def save():
+            with self._ann_index_lock:
+                try:
+                    index.save(self.ann_index_path)
+                except OSError as e:
+                    print(f"Could not save ANN index to {self.ann_index_path}: {e}")
+
+        threading.Thread(target=save, daemon=True).start()
+
     
-    def _start_background_saver(self):
-        def background_saver():
-            while True:
-                now = datetime.datetime.now().timestamp() * 1000
-                for personnel_id in list(self.recognition_data.keys()):
-                    if self.recognition_data[personnel_id]["timestamps"]:
-                        first_timestamp = self.recognition_data[personnel_id]["timestamps"][0]
-                        if now - first_timestamp >= 60000:
-                            self._save_aggregated_data(personnel_id)
-                time.sleep(5)  # Check every 5 seconds
-
-        saver_thread = threading.Thread(target=background_saver, daemon=True)
-        saver_thread.start()
-
-    def _save_and_log_face(self, face_image, label, similarity, emotion_scores, gender, age, is_known, camera_name, personnel_id):
+    def _save_and_log_face(self, face_image, label, similarity, emotion_scores, gender, age, is_known, camera_name, personnel_id, track_id=None, annotate_bbox=None):
         if face_image is None:
             print("Error: The face image is empty and cannot be saved.")
             return "Error: Empty face image"
         
-        if personnel_id is None:
+        if personnel_id is None and is_known:
             print("Error: Personnel ID is None and cannot be saved.")
             return "Error: Personnel ID is None"
         
@@ -239,369 +388,443 @@ class Stream:
         
         now = datetime.datetime.now()
         timestamp = int(now.timestamp() * 1000)
+        # Aggregate per track so one visit in front of one camera becomes one record
+        # Unknown visitors are keyed by their visitor id across cameras
+        identity = personnel_id if is_known else label
+        key = (camera_name, track_id, identity) if track_id is not None else identity
+        file_path = None
         
         # Store the first face image
-        if self.recognition_data[personnel_id]["image_path"] is None:
+        if not self.aggregator.has_image(key):
             # Generate filename and directory path
             filename_timestamp = now.strftime("%Y%m%d-%H%M%S")
             filename = f"{label}-{filename_timestamp}.jpg"
             base_dir = self.known_faces_dir if is_known else self.unknown_faces_dir
-            person_dir = os.path.join(base_dir, label)
-            os.makedirs(person_dir, exist_ok=True)
-            file_path = os.path.join(person_dir, filename)
+            file_path = os.path.join(base_dir, label, filename)
+
+            if annotate_bbox is not None:
+                x1, y1, x2, y2 = annotate_bbox
+                face_image = face_image.copy()
+                # Draw the bounding box and label on the frame
+                cv2.rectangle(face_image, (x1, y1), (x2, y2), (0, 255, 0), 2)  # Green color with thickness 2
+                cv2.putText(face_image, f"{label} ({similarity:.2f})", (x1, y1 - 5), cv2.FONT_HERSHEY_COMPLEX, 0.5, (0, 255, 0))
+
+            # Encoded and written by the persistence worker
+            if not self.persistence.save_image(file_path, face_image):
+                print("Error: Persistence queue is full, face image not saved.")
+                return "Error: Persistence queue full"
         
-            print(f"Saving face image to: {file_path}")
-        
-            try:
-                success = cv2.imwrite(file_path, face_image)
-                if not success:
-                    print("Error: Failed to save the image.")
-                    return "Error: Failed to save image"
-            except cv2.error as e:
-                print(f"OpenCV error: {e}")
-                return f"Error: OpenCV error - {e}"
-            except PermissionError as e:
-                print(f"Permission error: {e}")
-                return f"Error: Permission error - {e}"
-            except FileNotFoundError as e:
-                print(f"File not found error: {e}")
-                return f"Error: File not found error - {e}"
-            except Exception as e:
-                print(f"Unexpected error: {e}")
-                return f"Error: Unexpected error - {e}"
-        
-            self.recognition_data[personnel_id]["image_path"] = file_path
-        
-        # Store recognition data
-        self.recognition_data[personnel_id]["personnel_id"] = personnel_id
-        self.recognition_data[personnel_id]["label"] = label
-        self.recognition_data[personnel_id]["genders"].append(gender)
-        self.recognition_data[personnel_id]["timestamps"].append(timestamp)
-        self.recognition_data[personnel_id]["similarities"].append(float(similarity))  # Convert to native Python float
-        self.recognition_data[personnel_id]["ages"].append(age)
-        self.recognition_data[personnel_id]["camera_name"] = camera_name
-        
-        
-        for emotion_id, score in emotion_scores.items():
-            self.recognition_data[personnel_id]["emotion_scores"][emotion_id].append(score)
-        
-        return self.recognition_data[personnel_id]["image_path"]
-
-    def _save_aggregated_data(self, personnel_id):
-        data = self.recognition_data[personnel_id]
-        avg_similarity = np.mean(data["similarities"])
-        
-        # Calculate average for each emotion score
-        avg_emotion_scores = {emotion_id: np.mean(scores) for emotion_id, scores in data["emotion_scores"].items()}
-        
-        # Determine the most frequent emotion
-        most_frequent_emotion = max(avg_emotion_scores, key=avg_emotion_scores.get)
-        
-        avg_gender = 0 if data["genders"].count(0) / len(data["genders"]) > 0.2 else max(set(data["genders"]), key=data["genders"].count)
-        avg_age = np.min(data["ages"])
-
-        log_record = {
-            "timestamp": data["timestamps"][0],
-            "label": data["label"],
-            "similarity": round(float(avg_similarity), 2),
-            "emotion": most_frequent_emotion,  # Most frequent emotion
-            "gender": avg_gender,
-            "age": int(avg_age),
-            "camera": data["camera_name"],
-            "personnel_id": personnel_id,
-            "image_path": data["image_path"]  # Save only the first image path
-        }
-        
-        # Add the average emotion scores to the log record
-        for emotion_id, avg_score in avg_emotion_scores.items():
-            log_record[f"emotion_{emotion_id}"] = round(avg_score, 2)
-        
-        notify_new_face(log_record)
-        self.recognition_logs_collection.insert_one(log_record)
-        print(f"Aggregated data saved for personnel_id: {personnel_id}")
-
-        # Clear the stored data for this personnel_id
-        del self.recognition_data[personnel_id]
+        # Store recognition data as running sums
+        self.aggregator.add(key, timestamp, personnel_id, label, similarity, emotion_scores, gender, age, camera_name, image_path=file_path)
+        return file_path
+
+    def _maybe_harvest_template(self, personnel_id: str, embedding: np.ndarray, bbox: np.ndarray, scores: np.ndarray) -> bool:
+        """Keep a confident, sharp, frontal-enough match as an extra template of ``personnel_id``."""
+        config = self.template_config
+        if not config.get("harvest") or self.database.max_templates < 2:
+            return False
+        if scores[0] < config.get("harvest_similarity", 0.6) or scores[0] - scores[1] < config.get("min_margin", 0.1):
+            return False
+        if len(bbox) > 4 and bbox[4] < config.get("min_det_score", 0.8):
+            return False
+        if min(bbox[2] - bbox[0], bbox[3] - bbox[1]) < config.get("min_face_size", 80):
+            return False
+        now = time.monotonic()
+        if now - self.last_harvest.get(personnel_id, float("-inf")) < config.get("harvest_interval", 30.0):
+            return False
+        self.last_harvest[personnel_id] = now
+        # The crop must still match the enrollment photo on its own
+        return self.database.add_template(personnel_id, embedding, anchor_similarity=self.similarity_threshold)
+
+    def _get_tracker(self, camera_name: str) -> FaceTracker:
+        with self._trackers_lock:
+            tracker = self.trackers.get(camera_name)
+            if tracker is None:
+                tracker = self.trackers[camera_name] = FaceTracker(**self.tracker_config)
+            return tracker
 
     def _get_attributes(
         self, frame: np.ndarray, camera_name: str = None, spoofing: bool = False
     ) -> Tuple[
-        List[np.ndarray], List[str], List[float], List[str], List[str], List[int]
+        List[np.ndarray], List[str], List[float], List[str], List[str], List[int], List[bool]
     ]:
         if frame is None or len(frame.shape) < 2:
-            return [], [], [], [], [], []
-
-        # Detect faces using SCRFD
-        bboxes, kpss = self.face_detector.detect(frame, input_size=(640, 640), max_num=49, thresh=0.7)
-        if len(bboxes) == 0:
-            return [], [], [], [], [], []
-
-        labels, sims, emotions, ages, genders = [], [], [], [], []
+            return [], [], [], [], [], [], []
+        if self.scheduler is not None:
+            return self.scheduler.submit(frame, camera_name)
+        return self._analyze_frames([frame], [camera_name])[0]
+
+    def set_camera_regions(self, camera_name: str, regions: CameraRegions = None) -> None:
+        """Restrict detection on ``camera_name`` to its ROI; ``None`` clears the restriction."""
+        if regions is None or regions.is_empty:
+            self.camera_regions.pop(camera_name, None)
+        else:
+            self.camera_regions[camera_name] = regions
+
+    def _detect_frames(self, frames: List[np.ndarray], camera_names: List[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # Cameras with a region of interest only show their ROI rectangle to the detector
+        regions = [self.camera_regions.get(camera_name) for camera_name in camera_names]
+        offsets = []
+        crops = []
+        for frame, region in zip(frames, regions):
+            x1, y1, x2, y2 = region.crop_rect(frame.shape) if region is not None else (0, 0, frame.shape[1], frame.shape[0])
+            offsets.append((x1, y1))
+            crops.append(frame[y1:y2, x1:x2])
+        # Detect faces using SCRFD, one session call per scale for all frames when the model is batched
+        detections = self.face_detector.autodetect_batch(crops, max_num=49, metric="default", streams=camera_names)
+        for i, (frame, region, (x1, y1)) in enumerate(zip(frames, regions, offsets)):
+            bboxes, kpss = detections[i]
+            if region is None or len(bboxes) == 0:
+                continue
+            bboxes[:, [0, 2]] += x1
+            bboxes[:, [1, 3]] += y1
+            if kpss is not None:
+                kpss[:, :, 0] += x1
+                kpss[:, :, 1] += y1
+            detections[i] = region.filter(bboxes, kpss, frame.shape)
+        return detections
+
+    def _analyze_frames(self, frames: List[np.ndarray], camera_names: List[str]) -> List[Tuple]:
+        """
+        Run the whole pipeline for frames of one or more cameras at once.
 
-        for idx, kps in enumerate(kpss):
-            bbox = bboxes[idx]
-            x1, y1, x2, y2 = map(int, bbox[:4])
+        Faces of all frames that need recognition share one ArcFace, one gallery match, one
+        gender/age and one emotion batch. Returns one ``_get_attributes`` result per frame.
+        """
+        empty = ([], [], [], [], [], [], [])
+        results = [empty] * len(frames)
+        detections = self._detect_frames(frames, camera_names)
+
+        # Follow faces across frames; recognition results are cached per track
+        # Every face is addressed as (frame index, face index)
+        per_frame_tracks = {}
+        refresh = []
+        refreshing = set()  # A track seen in several frames of the batch is recognized once
+        for f, (frame, camera_name, (bboxes, kpss)) in enumerate(zip(frames, camera_names, detections)):
+            # Empty frames still age the tracks, so a face that left is dropped after max_age
+            tracker = self._get_tracker(camera_name)
+            tracks, removed_track_ids = tracker.update(bboxes)
+            for track_id in removed_track_ids:
+                self.emotion_state.forget((camera_name, track_id))
+            if len(bboxes) == 0:
+                continue
+            per_frame_tracks[f] = tracks
+            stale = [
+                idx for idx, track in enumerate(tracks)
+                if (camera_name, track.track_id) not in refreshing and tracker.needs_refresh(track, self.similarity_threshold)
+            ]
+            refreshing.update((camera_name, tracks[idx].track_id) for idx in stale)
 
             # Perform anti-spoofing check (if enabled)
-            if self.anti_spoof:
-                processed_frame, spoofing_label, spoofing_score, _ = self._perform_anti_spoofing_check(frame, bbox)
-                if spoofing_label != 1 or spoofing_score < 0.5:
-                    frame = processed_frame
+            if self.anti_spoof and stale:
+                spoofing_labels, spoofing_scores = self._perform_anti_spoofing_check(frame, bboxes[stale])
+                for idx, spoofing_label, spoofing_score in zip(stale, spoofing_labels, spoofing_scores):
+                    tracks[idx].live = spoofing_label == 1 and spoofing_score >= 0.5
+                stale = [idx for idx in stale if tracks[idx].live]
+            refresh.extend((f, idx) for idx in stale)
+
+        if refresh:
+            refresh_frames = [frames[f] for f, _ in refresh]
+            # Perform face recognition and match every stale face against the gallery at once
+            embeddings = self.face_recognizer.get_batch(refresh_frames, [detections[f][1][idx] for f, idx in refresh])
+            unknown_rows = []
+            # Top two identities, so harvesting can require a clear margin over the runner-up
+            match_keys, match_scores = self.database.match(embeddings, top_k=2)
+            # Gender and age for all stale faces in one run
+            face_genders, face_ages = self.gender_age_detector.get_batch(refresh_frames, [detections[f][0][idx] for f, idx in refresh])
+            for row, (f, idx) in enumerate(refresh):
+                track = per_frame_tracks[f][idx]
+                best_match = match_keys[row][0]
+                track.embedding = embeddings[row]
+                track.similarity = float(match_scores[row, 0])
+                if best_match is not None and track.similarity >= self.similarity_threshold:
+                    track.personnel_id = best_match
+                    track.label = self.database.label(best_match)
+                    self._maybe_harvest_template(best_match, embeddings[row], detections[f][0][idx], match_scores[row])
+                else:
+                    track.personnel_id = None
+                    track.label = track.visitor_id or "Unknown"
+                    bbox = detections[f][0][idx]
+                    if min(bbox[2] - bbox[0], bbox[3] - bbox[1]) >= self.unknown_min_face_size:
+                        unknown_rows.append(row)
+                track.gender, track.age = int(face_genders[row]), int(face_ages[row])
+                FaceTracker.mark_refreshed(track)
+            if self.unknown_visitors is not None and unknown_rows:
+                visitors = self.unknown_visitors.assign(embeddings[unknown_rows])
+                for row, (visitor_id, new_visit) in zip(unknown_rows, visitors):
+                    f, idx = refresh[row]
+                    track = per_frame_tracks[f][idx]
+                    track.visitor_id = track.label = visitor_id
+                    track.log_visit = track.log_visit or new_visit
+
+        kept, face_images = [], []
+        for f, tracks in per_frame_tracks.items():
+            frame, bboxes = frames[f], detections[f][0]
+            for idx, bbox in enumerate(bboxes):
+                if not tracks[idx].live:
                     continue
+                x1, y1, x2, y2 = map(int, bbox[:4])
+                # Crop the face region
+                face_image = frame[max(y1, 0):y2, max(x1, 0):x2]
 
-            # Perform face recognition
-            embedding = self.face_recognizer.get(frame, kps)
-            min_dist = float("inf")
-            best_match = None
-            label = "Unknown"
-            is_known = False   
-
-            # Match the face embedding with the database
-            for personnel_id in self.database.keys():
-                db_embedding = self.database[personnel_id]['embedding']
-                dist = np.linalg.norm(db_embedding - embedding)
-                if dist < min_dist:
-                    min_dist = dist
-                    best_match = personnel_id
-
-            sim = self.face_recognizer.compute_sim(embedding, self.database[best_match]['embedding'] if best_match else np.zeros_like(embedding))
-            if sim >= self.similarity_threshold:
-                label = self.database[best_match]['label']
-                is_known = True
-            # elif sim < self.similarity_threshold and sim > 0.11:
-            #     pass
-            # else:
-            #     unknown_count = len([key for key in self.database.keys() if key.startswith("Unknown")])
-            #     unknown_label = f"Unknown-{unknown_count + 1}"
-            #     self.database[unknown_label] = {"embedding": embedding, "label": unknown_label}
-            #     label = unknown_label
-            #     is_known = False
-            #     best_match = unknown_label
-
-            labels.append(label)
-            sims.append(sim)
-
-            # Get gender and age
-            gender, age = self.gender_age_detector.get(frame, face=bbox)
-            ages.append(age)
-            genders.append("M" if gender == 1 else "F")
-
-            # Crop the face region
-            face_image = frame[y1:y2, x1:x2]  # Crop the face region
-
-            # Check if the cropped face region is not empty
-            if face_image is None or face_image.size == 0:
-                print(f"Empty face image for bounding box: {x1}, {y1}, {x2}, {y2}")
-                continue
-            # Convert the face image to a PIL image
-            face_image = Image.fromarray(cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB))  # Convert to PIL image
-
-            # Preprocess the face image for emotion detection
-            face_tensor = pth_processing(face_image)
-            face_features = torch.nn.functional.relu(self.emotion_backbone_model.extract_features(face_tensor)).detach().cpu().numpy()
+                # Check if the cropped face region is not empty
+                if face_image is None or face_image.size == 0:
+                    print(f"Empty face image for bounding box: {x1}, {y1}, {x2}, {y2}")
+                    continue
+                kept.append((f, idx))
+                face_images.append(face_image)
+        if not kept:
+            return results
+
+        # Emotion history follows the track
+        emotion_outputs = self.emotion_state.predict(
+            face_images, [(camera_names[f], per_frame_tracks[f][idx].track_id) for f, idx in kept]
+        )
+
+        outputs = {f: ([], [], [], [], [], [], []) for f, _ in kept}
+        for emotion_output, (f, idx) in zip(emotion_outputs, kept):
+            frame, camera_name = frames[f], camera_names[f]
+            bbox = detections[f][0][idx]
+            track = per_frame_tracks[f][idx]
+            x1, y1, x2, y2 = map(int, bbox[:4])
+            kept_bboxes, labels, sims, emotions, genders, ages, known = outputs[f]
 
-            # Prepare LSTM input and predict emotion
-            lstm_features = [face_features] * 10  # Assuming you initialize with the same feature 10 times
-            lstm_f = torch.from_numpy(np.vstack(lstm_features)).to(self.device)
-            lstm_f = torch.unsqueeze(lstm_f, 0)
-            emotion_output = self.emotion_lstm_model(lstm_f).detach().cpu().numpy()
+            kept_bboxes.append(bbox)
+            labels.append(track.label)
+            # Unknown visitors carry an unknown-<n> label, so callers colour boxes by this flag
+            known.append(track.is_known)
+            sims.append(track.similarity)
+            ages.append(track.age)
+            genders.append("M" if track.gender == 1 else "F")
 
-            emotion_scores = {idx: score for idx, score in enumerate(emotion_output[0])}
-            # print("Emotion Scores:", emotion_scores)
+            emotion_scores = {idx: score for idx, score in enumerate(emotion_output)}
             # Get emotion label
-            emotion_label_idx = np.argmax(emotion_output)
-            emotion = DICT_EMO[emotion_label_idx]
+            emotion = DICT_EMO[int(np.argmax(emotion_output))]
             emotions.append(emotion)
 
-            frame_copy = frame.copy()
-            # Draw the bounding box and label on the frame
-            cv2.rectangle(frame_copy, (x1, y1), (x2, y2), (0, 255, 0), 2)  # Green color with thickness 2
-            cv2.putText(frame_copy, f"{label} ({sim:.2f})", (x1, y1 - 5), cv2.FONT_HERSHEY_COMPLEX, 0.5, (0, 255, 0))
-            # Save and log the recognized face
-            if is_known:
-                self._save_and_log_face(frame_copy, label, sim, emotion_scores, gender, age, is_known, camera_name, best_match)
-
-        return bboxes, labels, sims, emotions, genders, ages
-
-    def _perform_anti_spoofing_check(self, frame, bbox):
-        # Extract coordinates from the bounding box
-        x1, y1, x2, y2 = map(int, bbox[:4])
-        face_image = frame[y1:y2, x1:x2]
-
-        # Check if no face detected in the cropped area
-        if face_image is None or face_image.size == 0:
-            print("No face detected.")
-            return frame, None, None, 0
-
-        prediction = np.zeros((1, 3))
-        test_speed = 0
-
-        # Iterate through each anti-spoofing model in the directory
-        model_dir = os.path.dirname(self.anti_spoofing_model_path)
-        for model_name in os.listdir(model_dir):
-            model_path = os.path.join(model_dir, model_name)
-            h_input, w_input, model_type, scale = parse_model_name(model_name)
-            param = {
-                "org_img": frame,
-                "bbox": bbox,
-                "scale": scale,
-                "out_w": w_input,
-                "out_h": h_input,
-                "crop": True,
-            }
-            if scale is None:
-                param["crop"] = False
-            
-            # Crop the face image using the specified parameters
-            img = self.image_cropper.crop(**param)
-            
-            # Start the timer and run the prediction
-            start = time.time()
-            prediction += self.anti_spoof_predictor.predict(img, model_path)
-            test_speed += time.time() - start
-
-        # Determine the label and score from the accumulated predictions
-        label = np.argmax(prediction)
-        value = prediction[0][label] / 2  # Adjust score if necessary
-        
-        # Set text and color based on prediction results
-        if label == 1:
-            result_text = None
-            color = (0, 255, 0)
-        else:
-            result_text = "F-Score: {:.2f}".format(value)
-            color = (0, 0, 255)  # Red for fake face
-
-        # Draw the bounding box and label on the frame
-        # cv2.rectangle(
-        #     frame,
-        #     (x1, y1),
-        #     (x2, y2),
-        #     color, 2)
-        cv2.putText(
-            frame,
-            result_text,
-            (x1, y1 - 5),
-            cv2.FONT_HERSHEY_COMPLEX, 0.5 * frame.shape[0] / 1024, color)
-
-        return frame, label, value, test_speed
-
-    def recog_face_ip_cam(self, stream_id, camera: str, camera_name: str, is_recording=False):
+            # Save and log the recognized face; the annotated copy is only made when an image is needed
+            if track.is_known:
+                self._save_and_log_face(frame, track.label, track.similarity, emotion_scores, track.gender, track.age, True, camera_name, track.personnel_id, track.track_id, annotate_bbox=(x1, y1, x2, y2))
+            elif track.log_visit:
+                # One record per visit of an unknown visitor, not one per frame
+                track.log_visit = False
+                self._save_and_log_face(frame, track.label, track.similarity, emotion_scores, track.gender, track.age, False, camera_name, None, annotate_bbox=(x1, y1, x2, y2))
+
+        for f, output in outputs.items():
+            results[f] = output
+        return results
+
+    def _perform_anti_spoofing_check(self, frame, bboxes):
+        # One batched pass per anti-spoofing model for all faces
+        labels, values = self.anti_spoof_predictor.predict_batch(frame, bboxes)
+
+        for bbox, label, value in zip(bboxes, labels, values):
+            if label == 1:
+                continue
+            x1, y1 = int(bbox[0]), int(bbox[1])
+            cv2.putText(
+                frame,
+                "F-Score: {:.2f}".format(value),
+                (x1, y1 - 5),
+                cv2.FONT_HERSHEY_COMPLEX, 0.5 * frame.shape[0] / 1024, (0, 0, 255))  # Red for fake face
+
+        return labels, values
+
+    def recog_face_ip_cam(self, stream_id, camera: str, camera_name: str, is_recording=False, max_fps: float = None, max_width: int = None, jpeg_quality: int = None):
         if stream_id not in self.stop_flags:
             logging.error(f"No stop flag found for stream ID {stream_id}")
             return
     
         stop_flag = self.stop_flags[stream_id]
         stop_flag.clear()
-        logging.info(f"Opening stream: {stream_id} / camera: {camera}")
+        logging.info(f"Opening stream: {stream_id} / camera: {camera_name}")
         if camera is None:
             raise ValueError("Camera URL must be provided and cannot be None")
-    
-        cap = cv2.VideoCapture(camera)
-        print("Camera Opened:  " + str(cap.isOpened()))
-        writer = None
-        if is_recording:
-            now = datetime.datetime.now()
-            directory = "./records/"
-            if not os.path.exists(directory):
-                os.makedirs(directory)
-            filename = directory + now.strftime("%H:%M:%S_%d.%m.%Y") + ".mp4"
-    
-        while not stop_flag.is_set():
-            ret, frame = cap.read()
-            if not ret:
-                logging.error("Error reading frame")
-                break
-            if is_recording and writer is None:
-                frame_height, frame_width = frame.shape[:2]
-                fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-                writer = cv2.VideoWriter(
-                    filename, fourcc, 20.0, (frame_width, frame_height)
+
+        # Viewers of the same camera share one capture + analysis pipeline whatever stream profile
+        # they asked for: trackers, emotion state and ROIs are per camera too. The first viewer's
+        # URL sets the capture profile; other viewers are scaled down through max_width.
+        # The shared pipeline records while any of its subscribers asked for it
+        key = camera_name or camera
+        pipeline = self.camera_hub.subscribe(key, camera_name, lambda p: self._run_ip_camera(p, camera, camera_name), recording=is_recording, url=camera)
+        if pipeline.url != camera:
+            logging.info(f"Camera {camera_name} is already captured from {pipeline.url}; sharing it with stream {stream_id}")
+        self.stream_pipelines[stream_id] = pipeline
+        viewer = self.stream_viewers[stream_id] = StreamViewer(max_fps, max_width, jpeg_quality)
+        seq = 0
+        try:
+            while not stop_flag.is_set():
+                # Honour max_fps by waiting here; frames published meanwhile are skipped
+                delay = viewer.delay()
+                if delay and stop_flag.wait(delay):
+                    break
+                new_seq, jpeg = pipeline.wait_frame(seq, max_width=viewer.max_width, quality=viewer.quality)
+                if jpeg is None:
+                    if pipeline.finished:
+                        break
+                    continue
+                viewer.on_frame(new_seq, seq)
+                seq = new_seq
+                sent_at = time.monotonic()
+                yield (
+                    b"--frame\r\n"
+                    b"Content-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
                 )
-                if not writer.isOpened():
-                    logging.error("Error initializing video writer")
+                # The generator resumes once the server has written the chunk to the client
+                viewer.on_sent(time.monotonic() - sent_at)
+        finally:
+            # Also runs when the client disconnects and the generator is closed
+            if self.stream_pipelines.get(stream_id) is pipeline:
+                del self.stream_pipelines[stream_id]
+            if self.stream_viewers.get(stream_id) is viewer:
+                del self.stream_viewers[stream_id]
+            self.camera_hub.unsubscribe(pipeline, recording=is_recording)
+        logging.info("Finished generate function")
+
+    def _run_ip_camera(self, pipeline: CameraPipeline, camera: str, camera_name: str):
+        """Capture, analyze, annotate and JPEG-encode frames of one camera until the pipeline stops."""
+        # The reader thread keeps draining the camera; we only ever process the newest frame
+        reader = LatestFrameReader(camera, name=camera_name)
+        print("Camera Opened:  " + str(reader.is_opened()))
+        reader.start()
+        self.stream_readers[pipeline.key] = reader
+        gate = MotionGate(**self.motion_gate_config) if self.motion_gate_enabled else None
+        if gate is not None:
+            self.motion_gates[pipeline.key] = gate
+        attributes = [], [], [], [], [], [], []
+        writer = None
+
+        try:
+            while not pipeline.stop_event.is_set():
+                ret, frame, captured_at = reader.read()
+                if not ret:
+                    logging.error("Error reading frame")
                     break
-            for bbox, label, sim, emotion, gender, age in zip(
-                            *self._get_attributes(frame, camera_name)
-                        ):
-                            x1, y1, x2, y2 = map(int, bbox[:4])
-                            if label == "Unknown":
-                                cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 4)  # Blue borders
-                                text_label = f"{label}: {emotion}, gender: {gender}, age: {age}"
-                                text_color = (255, 0, 0)  # Blue text
-                            else:
-                                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 4)  # Green borders
-                                text_label = f"{label} ({sim * 100:.2f}%): {emotion}, gender: {gender}, age: {age}"
-                                text_color = (0, 255, 0)  # Green text
-                            cv2.putText(
-                                frame,
-                                text_label,
-                                (x1 + 5, y1 - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX,
-                                0.8,
-                                text_color,
-                                2,
-                            )
+                if writer and not pipeline.recording:
+                    # The last subscriber that asked for recording has left
+                    writer.release()
+                    writer = None
+                if pipeline.recording and writer is None:
+                    now = datetime.datetime.now()
+                    directory = "./records/"
+                    if not os.path.exists(directory):
+                        os.makedirs(directory)
+                    filename = directory + now.strftime("%H:%M:%S_%d.%m.%Y") + ".mp4"
+                    frame_height, frame_width = frame.shape[:2]
+                    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+                    writer = cv2.VideoWriter(
+                        filename, fourcc, 20.0, (frame_width, frame_height)
+                    )
+                    if not writer.isOpened():
+                        logging.error("Error initializing video writer")
+                        break
+                # A static scene keeps the previous detections
+                if gate is None or gate.should_detect(frame):
+                    attributes = self._get_attributes(frame, camera_name)
+                for bbox, label, sim, emotion, gender, age, is_known in zip(
+                                *attributes
+                            ):
+                                x1, y1, x2, y2 = map(int, bbox[:4])
+                                if not is_known:
+                                    cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 4)  # Blue borders
+                                    text_label = f"{label}: {emotion}, gender: {gender}, age: {age}"
+                                    text_color = (255, 0, 0)  # Blue text
+                                else:
+                                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 4)  # Green borders
+                                    text_label = f"{label} ({sim * 100:.2f}%): {emotion}, gender: {gender}, age: {age}"
+                                    text_color = (0, 255, 0)  # Green text
+                                cv2.putText(
+                                    frame,
+                                    text_label,
+                                    (x1 + 5, y1 - 10),
+                                    cv2.FONT_HERSHEY_SIMPLEX,
+                                    0.8,
+                                    text_color,
+                                    2,
+                                )
+                if writer:
+                    writer.write(frame)
+                # Encoded once by the hub and sent to every viewer of this camera
+                yield frame
+                reader.mark_done(captured_at)
+        finally:
+            reader.stop()
+            if self.stream_readers.get(pipeline.key) is reader:
+                del self.stream_readers[pipeline.key]
+            if gate is not None and self.motion_gates.get(pipeline.key) is gate:
+                del self.motion_gates[pipeline.key]
             if writer:
-                writer.write(frame)
-            _, buffer = cv2.imencode(".jpg", frame)
-            yield (
-                b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n" + buffer.tobytes() + b"\r\n"
-            )
-    
-        cap.release()
-        if writer:
-            writer.release()
-        logging.info("Finished generate function")
-    
+                writer.release()
+
     def recog_face_local_cam(self, stream_id, frame: np.ndarray, camera_name: str, is_recording: bool = False) -> str:
+        processed = self.recog_face_local_cam_batch(stream_id, [frame], camera_name, is_recording)[0]
+        if processed is None:
+            return ""
+        _, buffer = cv2.imencode(".jpg", processed)
+        processed_image = base64.b64encode(buffer).decode('utf-8')
+        return 'data:image/jpeg;base64,' + processed_image
+
+    def recog_face_local_cam_batch(self, stream_id, frames: List[np.ndarray], camera_name: str, is_recording: bool = False) -> List[np.ndarray]:
+        """
+        Analyze all frames of one local camera message in a single batched pass and annotate them in place.
+
+        :return: The annotated frames, in order; None for frames that were empty or could not be processed.
+        """
+        results = [None] * len(frames)
         if stream_id not in self.stop_flags:
             logging.error(f"No stop flag found for stream ID {stream_id}")
-            return ""
+            return results
 
         stop_flag = self.stop_flags[stream_id]
         stop_flag.clear()
-        logging.info("Processing frame")
+        logging.info(f"Processing {len(frames)} frames")
 
-        if frame is None or frame.size == 0:
+        valid = [i for i, frame in enumerate(frames) if frame is not None and frame.size > 0]
+        if len(valid) < len(frames):
             logging.error("Error reading frame: Frame is None or empty")
-            return ""
+        if not valid:
+            return results
+        batch = [frames[i] for i in valid]
 
         if is_recording and stream_id not in self.video_writers:
             now = datetime.datetime.now()
             directory = "./records/"
             os.makedirs(directory, exist_ok=True)
             filename = directory + now.strftime("%H:%M:%S_%d.%m.%Y_yerel_kamera") + ".mp4"
-            frame_height, frame_width = frame.shape[:2]
+            frame_height, frame_width = batch[0].shape[:2]
             fourcc = cv2.VideoWriter_fourcc(*"mp4v")
             self.video_writers[stream_id] = cv2.VideoWriter(filename, fourcc, 20.0, (frame_width, frame_height))
             if not self.video_writers[stream_id].isOpened():
                 logging.error(f"Error initializing video writer for file {filename}")
                 logging.error(f"Frame dimensions: {frame_width}x{frame_height}")
                 logging.error(f"Codec: mp4v")
-                return ""
-
-        for bbox, label, sim, emotion, gender, age in zip(*self._get_attributes(frame, camera_name)):
-            x1, y1, x2, y2 = map(int, bbox[:4])
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 4)
-            text_label = f"{label} ({sim * 100:.2f}%): {emotion}, gender: {gender}, age: {age}"
-            cv2.putText(
-                frame,
-                text_label,
-                (x1 + 5, y1 - 10),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
-                (0, 255, 0),
-                2,
-            )
-
-        if stream_id in self.video_writers:
-            self.video_writers[stream_id].write(frame)
+                return results
+
+        # The frames of a message are consecutive frames of one camera: one detection/recognition batch
+        for i, frame, attributes in zip(valid, batch, self._analyze_frames(batch, [camera_name] * len(batch))):
+            for bbox, label, sim, emotion, gender, age, is_known in zip(*attributes):
+                x1, y1, x2, y2 = map(int, bbox[:4])
+                if is_known:
+                    color = (0, 255, 0)  # Green
+                    text_label = f"{label} ({sim * 100:.2f}%): {emotion}, gender: {gender}, age: {age}"
+                else:
+                    color = (255, 0, 0)  # Blue
+                    text_label = f"{label}: {emotion}, gender: {gender}, age: {age}"
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 4)
+                cv2.putText(
+                    frame,
+                    text_label,
+                    (x1 + 5, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.8,
+                    color,
+                    2,
+                )
 
-        _, buffer = cv2.imencode(".jpg", frame)
-        processed_image = base64.b64encode(buffer).decode('utf-8')
-        return 'data:image/jpeg;base64,' + processed_image
+            if stream_id in self.video_writers:
+                self.video_writers[stream_id].write(frame)
+            results[i] = frame
+        return results
 
 
 
@@ -631,6 +854,39 @@ class Stream:
         logging.info(f"Stream with ID {stream_id} stopped successfully")
 
 
+    def get_stream_stats(self, stream_id: int = None) -> Dict:
+        """Dropped-frame, latency, motion-gate and viewer counters of the running IP camera streams."""
+        pipelines = dict(self.stream_pipelines)
+        viewers = dict(self.stream_viewers)
+
+        def pipeline_stats(sid, pipeline):
+            reader = self.stream_readers.get(pipeline.key)
+            if reader is None:
+                return None
+            stats = dict(reader.stats(), camera=reader.name, viewers=pipeline.viewers)
+            if sid in viewers:
+                stats["viewer"] = viewers[sid].stats()
+            gate = self.motion_gates.get(pipeline.key)
+            if gate is not None:
+                stats["motion"] = gate.stats()
+            return stats
+
+        if stream_id is not None:
+            pipeline = pipelines.get(stream_id)
+            return None if pipeline is None else pipeline_stats(stream_id, pipeline)
+        stats = {str(sid): pipeline_stats(sid, pipeline) for sid, pipeline in pipelines.items()}
+        stats = {sid: value for sid, value in stats.items() if value is not None}
+        stats["hub"] = self.camera_hub.stats()
+        stats["persistence"] = self.persistence.stats()
+        stats["aggregator"] = self.aggregator.stats()
+        stats["gallery"] = self.database.stats()
+        stats["detection"] = self.face_detector.multiscale.stats()
+        if self.unknown_visitors is not None:
+            stats["unknown_visitors"] = self.unknown_visitors.stats()
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.stats()
+        return stats
+
     def stop_recording(self, stream_id: int) -> bool:
         if stream_id in self.video_writers:
             self.video_writers[stream_id].release()
@@ -0,0 +1,156 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+__all__ = [
+    "RecognitionAggregator",
+]
+
+
+class _Accumulator:
+    """Running sums for one identity's visit; constant size however many sightings it gets."""
+
+    __slots__ = ("personnel_id", "label", "camera_name", "image_path", "first_timestamp", "count",
+                 "similarity_sum", "emotion_sums", "genders", "min_age")
+
+    def __init__(self, first_timestamp: int) -> None:
+        self.personnel_id = None
+        self.label = None
+        self.camera_name = None
+        self.image_path = None
+        self.first_timestamp = first_timestamp
+        self.count = 0
+        self.similarity_sum = 0.0
+        self.emotion_sums: Optional[np.ndarray] = None
+        self.genders: Counter = Counter()
+        self.min_age = None
+
+    def record(self) -> Dict:
+        avg_emotion_scores = self.emotion_sums / self.count if self.emotion_sums is not None else np.zeros(0)
+        # Same rules as the list-based aggregation: female if over 20% of sightings say so, youngest age
+        if self.genders[0] / self.count > 0.2:
+            gender = 0
+        else:
+            gender = self.genders.most_common(1)[0][0]
+        log_record = {
+            "timestamp": self.first_timestamp,
+            "label": self.label,
+            "similarity": round(self.similarity_sum / self.count, 2),
+            "emotion": int(np.argmax(avg_emotion_scores)) if len(avg_emotion_scores) else None,  # Most frequent emotion
+            "gender": gender,
+            "age": int(self.min_age) if self.min_age is not None else None,
+            "camera": self.camera_name,
+            "personnel_id": self.personnel_id,
+            "image_path": self.image_path,  # Save only the first image path
+        }
+        # Add the average emotion scores to the log record
+        for emotion_id, avg_score in enumerate(avg_emotion_scores):
+            log_record[f"emotion_{emotion_id}"] = round(float(avg_score), 2)
+        return log_record
+
+
+class RecognitionAggregator:
+    """
+    Collapses the sightings of one identity into a single log record per ``window`` seconds.
+
+    Each key gets an accumulator on its first sighting and a flush deadline on a min-heap.
+    A flusher thread sleeps until the earliest deadline, pops every due key and hands
+    their records to ``sink`` in one call, so the cost of a flush scales with the number
+    of identities due rather than with the number of sightings or tracked keys.
+    """
+
+    def __init__(self, sink: Callable[[List[Dict]], None], window: float = 60.0) -> None:
+        self.sink = sink
+        self.window = window
+        self._accumulators: Dict[Hashable, _Accumulator] = {}
+        self._heap: List = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self.flushes = 0
+        self.records_flushed = 0
+        self._thread = threading.Thread(target=self._run, name="recognition-aggregator", daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._accumulators)
+
+    def has_image(self, key: Hashable) -> bool:
+        with self._cond:
+            accumulator = self._accumulators.get(key)
+            return accumulator is not None and accumulator.image_path is not None
+
+    def add(self, key: Hashable, timestamp: int, personnel_id, label: str, similarity: float, emotion_scores: Dict,
+            gender, age, camera_name: str, image_path: Optional[str] = None) -> None:
+        """Fold one sighting into the accumulator of ``key``."""
+        scores = np.fromiter((emotion_scores[i] for i in sorted(emotion_scores)), dtype=np.float64, count=len(emotion_scores))
+        with self._cond:
+            accumulator = self._accumulators.get(key)
+            if accumulator is None:
+                accumulator = self._accumulators[key] = _Accumulator(timestamp)
+                heapq.heappush(self._heap, (time.monotonic() + self.window, next(self._order), key))
+                if self._heap[0][2] == key:
+                    self._cond.notify()
+            accumulator.personnel_id = personnel_id
+            accumulator.label = label
+            accumulator.camera_name = camera_name
+            if accumulator.image_path is None:
+                accumulator.image_path = image_path
+            accumulator.count += 1
+            accumulator.similarity_sum += float(similarity)
+            if accumulator.emotion_sums is None:
+                accumulator.emotion_sums = scores
+            elif len(scores) == len(accumulator.emotion_sums):
+                accumulator.emotion_sums += scores
+            accumulator.genders[gender] += 1
+            if age is not None and (accumulator.min_age is None or age < accumulator.min_age):
+                accumulator.min_age = age
+
+    def _pop_due(self, now: float) -> List[Dict]:
+        records = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, key = heapq.heappop(self._heap)
+            accumulator = self._accumulators.pop(key, None)
+            if accumulator is not None and accumulator.count:
+                records.append(accumulator.record())
+        return records
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+                records = self._pop_due(time.monotonic())
+            if records:
+                self._emit(records)
+
+    def _emit(self, records: List[Dict]) -> None:
+        try:
+            self.sink(records)
+        except Exception:
+            logging.exception("Failed to flush aggregated recognition records")
+            return
+        self.flushes += 1
+        self.records_flushed += len(records)
+
+    def flush(self) -> None:
+        """Flush every open accumulator now, regardless of its deadline."""
+        with self._cond:
+            records = self._pop_due(float("inf"))
+        if records:
+            self._emit(records)
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "open_identities": len(self._accumulators),
+                "flushes": self.flushes,
+                "records_flushed": self.records_flushed,
+            }
@@ -0,0 +1,239 @@
+import argparse
+import io
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.camera_processor.gallery import l2_normalize
+
+__all__ = [
+    "IVFIndex",
+]
+
+
+class IVFIndex:
+    """
+    CPU inverted-file index for cosine search over L2-normalized embeddings.
+
+    Vectors are assigned to the nearest of ``nlist`` spherical k-means centroids and kept
+    in one contiguous array per list. A query only scores the vectors of its ``nprobe``
+    closest lists, so search cost grows with ``N * nprobe / nlist`` instead of ``N``.
+    Inserts and deletes are incremental; the centroids only change on ``train``, so the
+    owner should retrain once ``imbalance`` shows the lists have drifted apart.
+    """
+
+    def __init__(self, dim: int = 512, nlist: int = 1024, nprobe: int = 32) -> None:
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self._lock = threading.RLock()
+        self._reset_lists()
+
+    def _reset_lists(self) -> None:
+        self._vectors: List[np.ndarray] = [np.zeros((0, self.dim), dtype=np.float32) for _ in range(self.nlist)]
+        self._sizes = np.zeros(self.nlist, dtype=np.int64)
+        self._keys: List[List[str]] = [[] for _ in range(self.nlist)]
+        self._where: Dict[str, Tuple[int, int]] = {}
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._where
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._where)
+
+    def imbalance(self) -> float:
+        """``nlist * sum(size^2) / N^2``: 1.0 for equal lists, and the search cost grows with it."""
+        with self._lock:
+            total = int(self._sizes.sum())
+            if total == 0:
+                return 1.0
+            return float(self.nlist * np.square(self._sizes).sum() / total ** 2)
+
+    def train(self, vectors: np.ndarray, iterations: int = 10, max_samples: int = 64, seed: int = 0) -> None:
+        """Fit the coarse quantizer with spherical k-means and clear all lists."""
+        vectors = l2_normalize(np.atleast_2d(vectors))
+        rng = np.random.default_rng(seed)
+        nlist = max(1, min(self.nlist, vectors.shape[0]))
+        sample_size = min(vectors.shape[0], nlist * max_samples)
+        sample = vectors[rng.choice(vectors.shape[0], sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            # Re-seed empty lists with random samples so no centroid is wasted
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = l2_normalize(sums)
+        with self._lock:
+            self.dim = vectors.shape[1]
+            self.nlist = nlist
+            self.centroids = centroids.astype(np.float32)
+            self._reset_lists()
+
+    def add(self, key: str, vector: np.ndarray) -> None:
+        if not self.is_trained:
+            raise RuntimeError("IVFIndex must be trained before adding vectors")
+        vector = l2_normalize(np.ravel(vector))
+        with self._lock:
+            self.remove(key)
+            list_id = int(np.argmax(self.centroids @ vector))
+            size = int(self._sizes[list_id])
+            vectors = self._vectors[list_id]
+            if size == vectors.shape[0]:
+                grown = np.zeros((max(8, size * 2), self.dim), dtype=np.float32)
+                grown[:size] = vectors[:size]
+                self._vectors[list_id] = vectors = grown
+            vectors[size] = vector
+            self._keys[list_id].append(key)
+            self._sizes[list_id] = size + 1
+            self._where[key] = (list_id, size)
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            location = self._where.pop(key, None)
+            if location is None:
+                return False
+            list_id, pos = location
+            last = int(self._sizes[list_id]) - 1
+            keys = self._keys[list_id]
+            if pos != last:
+                self._vectors[list_id][pos] = self._vectors[list_id][last]
+                keys[pos] = keys[last]
+                self._where[keys[pos]] = (list_id, pos)
+            keys.pop()
+            self._sizes[list_id] = last
+            return True
+
+    def search(self, queries: np.ndarray, top_k: int = 1, nprobe: Optional[int] = None) -> Tuple[List[List[Optional[str]]], np.ndarray]:
+        """Same contract as ``FaceGallery.match``: per-query top-k keys and cosine scores."""
+        queries = l2_normalize(np.atleast_2d(queries))
+        num_queries = queries.shape[0]
+        keys: List[List[Optional[str]]] = [[None] * top_k for _ in range(num_queries)]
+        scores = np.zeros((num_queries, top_k), dtype=np.float32)
+        if num_queries == 0 or not self.is_trained:
+            return keys, scores
+
+        with self._lock:
+            nprobe = min(nprobe or self.nprobe, self.nlist)
+            coarse = queries @ self.centroids.T
+            probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+            for i in range(num_queries):
+                candidate_keys: List[str] = []
+                candidate_scores = []
+                for list_id in probes[i]:
+                    size = int(self._sizes[list_id])
+                    if size == 0:
+                        continue
+                    candidate_scores.append(self._vectors[list_id][:size] @ queries[i])
+                    candidate_keys.extend(self._keys[list_id])
+                if not candidate_keys:
+                    continue
+                sims = np.concatenate(candidate_scores)
+                k = min(top_k, sims.shape[0])
+                best = np.argpartition(-sims, k - 1)[:k]
+                best = best[np.argsort(-sims[best])]
+                keys[i][:k] = [candidate_keys[j] for j in best]
+                scores[i, :k] = sims[best]
+        return keys, scores
+
+    def save(self, path: str) -> None:
+        """Write the index atomically so a crash never leaves a truncated file behind."""
+        with self._lock:
+            if not self.is_trained:
+                return
+            list_ids = np.concatenate([np.full(int(size), list_id, dtype=np.int32) for list_id, size in enumerate(self._sizes)])
+            vectors = np.concatenate([self._vectors[list_id][:int(size)] for list_id, size in enumerate(self._sizes)])
+            keys = np.array([key for list_keys in self._keys for key in list_keys], dtype=str)
+            buffer = io.BytesIO()
+            np.savez(
+                buffer,
+                centroids=self.centroids,
+                list_ids=list_ids,
+                vectors=vectors.reshape(-1, self.dim),
+                keys=keys,
+                params=np.array([self.dim, self.nlist, self.nprobe], dtype=np.int64),
+            )
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, nprobe: Optional[int] = None) -> "IVFIndex":
+        with np.load(path, allow_pickle=False) as data:
+            dim, nlist, saved_nprobe = (int(v) for v in data["params"])
+            index = cls(dim=dim, nlist=nlist, nprobe=nprobe or saved_nprobe)
+            index.centroids = data["centroids"].astype(np.float32)
+            list_ids = data["list_ids"]
+            vectors = data["vectors"]
+            keys = data["keys"]
+        order = np.argsort(list_ids, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(list_ids, minlength=nlist))])
+        for list_id in range(nlist):
+            rows = order[bounds[list_id]:bounds[list_id + 1]]
+            index._vectors[list_id] = np.ascontiguousarray(vectors[rows], dtype=np.float32)
+            index._keys[list_id] = [str(k) for k in keys[rows]]
+            index._sizes[list_id] = rows.shape[0]
+            for pos, key in enumerate(index._keys[list_id]):
+                index._where[key] = (list_id, pos)
+        return index
+
+
+def benchmark(gallery_path: Optional[str] = None, size: int = 100000, queries: int = 500, nlist: int = 1024, noise: float = 0.6, seed: int = 0) -> None:
+    """
+    Compare recall@1 and per-query latency of the IVF index against exact search.
+
+    Queries are noisy copies of gallery vectors, which is how a camera probe relates to
+    an enrollment photo. Pass a saved (N, D) ``.npy`` gallery to measure real embeddings.
+    """
+    rng = np.random.default_rng(seed)
+    if gallery_path:
+        gallery = l2_normalize(np.load(gallery_path))
+    else:
+        gallery = l2_normalize(rng.standard_normal((size, 512)).astype(np.float32))
+    truth = rng.choice(gallery.shape[0], queries, replace=False)
+    probes = l2_normalize(gallery[truth] + noise * l2_normalize(rng.standard_normal((queries, gallery.shape[1]))).astype(np.float32))
+    print(f"Gallery: {gallery.shape[0]} x {gallery.shape[1]}, queries: {queries}")
+
+    start = time.perf_counter()
+    exact = np.array([np.argmax(gallery @ q) for q in probes])
+    exact_ms = (time.perf_counter() - start) * 1000 / queries
+    print(f"exact     recall@1=1.000 (vs truth {np.mean(exact == truth):.3f})  {exact_ms:.3f} ms/query")
+
+    index = IVFIndex(dim=gallery.shape[1], nlist=nlist)
+    start = time.perf_counter()
+    index.train(gallery)
+    for row, vector in enumerate(gallery):
+        index.add(str(row), vector)
+    print(f"index build: {time.perf_counter() - start:.1f} s")
+
+    for nprobe in (1, 4, 8, 16, 32, 64):
+        start = time.perf_counter()
+        found = [index.search(q, nprobe=nprobe)[0][0][0] for q in probes]
+        ivf_ms = (time.perf_counter() - start) * 1000 / queries
+        recall = np.mean([f is not None and int(f) == e for f, e in zip(found, exact)])
+        print(f"nprobe={nprobe:<3} recall@1={recall:.3f}  {ivf_ms:.3f} ms/query  speedup x{exact_ms / ivf_ms:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IVF index recall vs latency benchmark")
+    parser.add_argument("--gallery", type=str, default=None, help="Optional (N, D) .npy embedding matrix")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--nlist", type=int, default=1024)
+    args = parser.parse_args()
+    benchmark(args.gallery, args.size, args.queries, args.nlist)
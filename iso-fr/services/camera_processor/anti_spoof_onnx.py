@@ -0,0 +1,147 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import onnxruntime
+
+from services.camera_processor.generate_patches import CropImage
+from services.camera_processor.utility import parse_model_name
+
+__all__ = [
+    "AntiSpoofONNX",
+    "export_onnx",
+]
+
+
+def _softmax(x):
+    x = x - np.max(x, axis=1, keepdims=True)
+    e = np.exp(x)
+    return e / np.sum(e, axis=1, keepdims=True)
+
+
+class AntiSpoofONNX:
+    """
+    ONNX Runtime twin of ``AntiSpoofPredict``: same ``predict`` / ``predict_batch``
+    interface, no torch import. Loads every ``.onnx`` file produced by ``export_onnx``
+    from ``model_dir``.
+    """
+
+    def __init__(self, model_dir, providers=None):
+        self.image_cropper = CropImage()
+        self.providers = providers or onnxruntime.get_available_providers()
+        self._sessions = {}
+        for model_name in sorted(os.listdir(model_dir)):
+            if model_name.endswith(".onnx"):
+                self._load_model(os.path.join(model_dir, model_name))
+
+    @property
+    def model_names(self):
+        return [os.path.basename(model_path) for model_path in self._sessions]
+
+    def _load_model(self, model_path):
+        if model_path not in self._sessions:
+            self._sessions[model_path] = onnxruntime.InferenceSession(model_path, providers=self.providers)
+        return self._sessions[model_path]
+
+    def _run(self, session, batch):
+        input_name = session.get_inputs()[0].name
+        return _softmax(session.run(None, {input_name: batch})[0])
+
+    def predict(self, img, model_path):
+        model_path = os.path.splitext(model_path)[0] + ".onnx"
+        batch = img.transpose(2, 0, 1)[None].astype(np.float32)
+        return self._run(self._load_model(model_path), batch)
+
+    def predict_batch(self, frame, bboxes):
+        """Same contract as ``AntiSpoofPredict.predict_batch``."""
+        num_faces = len(bboxes)
+        prediction = np.zeros((num_faces, 3), dtype=np.float32)
+        if num_faces == 0 or not self._sessions:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=np.float32)
+        # CropImage expects (x, y, width, height)
+        boxes = [[int(b[0]), int(b[1]), max(int(b[2] - b[0]), 1), max(int(b[3] - b[1]), 1)] for b in bboxes]
+        for model_path, session in self._sessions.items():
+            h_input, w_input, _, scale = parse_model_name(os.path.basename(model_path))
+            crops = [
+                self.image_cropper.crop(frame, box, scale, w_input, h_input, crop=scale is not None)
+                for box in boxes
+            ]
+            batch = np.ascontiguousarray(np.stack(crops).transpose(0, 3, 1, 2), dtype=np.float32)
+            prediction += self._run(session, batch)
+        labels = np.argmax(prediction, axis=1)
+        scores = prediction[np.arange(num_faces), labels] / len(self._sessions)
+        return labels, scores
+
+
+def export_onnx(model_path, output_path=None, opset=11):
+    """Export one MiniFASNet ``.pth`` checkpoint to ONNX with a dynamic batch dimension."""
+    import torch
+    from services.camera_processor.anti_spoof_predict import AntiSpoofPredict
+
+    output_path = output_path or os.path.splitext(model_path)[0] + ".onnx"
+    predictor = AntiSpoofPredict(0)
+    predictor.device = torch.device("cpu")
+    model = predictor._build_model(model_path)
+    h_input, w_input, _, _ = parse_model_name(os.path.basename(model_path))
+    dummy = torch.zeros(1, 3, h_input, w_input)
+    torch.onnx.export(
+        model,
+        dummy,
+        output_path,
+        input_names=["input"],
+        output_names=["output"],
+        dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+        opset_version=opset,
+    )
+    print(f"Exported {model_path} -> {output_path}")
+    return output_path
+
+
+def check(model_dir, faces=8, repeats=20, atol=1e-4):
+    """Compare ONNX Runtime (CPU) against the torch models: output parity and per-face latency."""
+    from services.camera_processor.anti_spoof_predict import AntiSpoofPredict
+
+    torch_predictor = AntiSpoofPredict(0, model_dir=model_dir)
+    onnx_predictor = AntiSpoofONNX(model_dir, providers=["CPUExecutionProvider"])
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+    bboxes = [[100 + 120 * i, 200, 200 + 120 * i, 320] for i in range(faces)]
+
+    ok = True
+    for model_name in torch_predictor.model_names:
+        model_path = os.path.join(model_dir, model_name)
+        h_input, w_input, _, scale = parse_model_name(model_name)
+        for bbox in bboxes[:2]:
+            x1, y1, x2, y2 = bbox
+            img = torch_predictor.image_cropper.crop(frame, [x1, y1, x2 - x1, y2 - y1], scale, w_input, h_input, crop=scale is not None)
+            diff = np.max(np.abs(torch_predictor.predict(img, model_path) - onnx_predictor.predict(img, model_path)))
+            ok = ok and diff <= atol
+            print(f"{model_name}: max |torch - onnx| = {diff:.2e}")
+    torch_labels, torch_scores = torch_predictor.predict_batch(frame, bboxes)
+    onnx_labels, onnx_scores = onnx_predictor.predict_batch(frame, bboxes)
+    ok = ok and np.array_equal(torch_labels, onnx_labels) and np.allclose(torch_scores, onnx_scores, atol=atol)
+    print(f"Parity: {'OK' if ok else 'MISMATCH'}")
+
+    for name, predictor in (("torch", torch_predictor), ("onnx", onnx_predictor)):
+        predictor.predict_batch(frame, bboxes)  # warm-up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            predictor.predict_batch(frame, bboxes)
+        print(f"{name:<6} {(time.perf_counter() - start) * 1000 / (repeats * faces):8.2f} ms/face ({faces} faces per batch)")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MiniFASNet ONNX export and parity/latency check")
+    parser.add_argument("command", choices=["export", "check"])
+    parser.add_argument("--model_dir", type=str, default=os.path.join(os.path.dirname(__file__), "../models/anti_spoof_models"))
+    parser.add_argument("--opset", type=int, default=11)
+    parser.add_argument("--faces", type=int, default=8)
+    args = parser.parse_args()
+    if args.command == "export":
+        for model_name in sorted(os.listdir(args.model_dir)):
+            if model_name.endswith(".pth"):
+                export_onnx(os.path.join(args.model_dir, model_name), opset=args.opset)
+    else:
+        raise SystemExit(0 if check(args.model_dir, faces=args.faces) else 1)
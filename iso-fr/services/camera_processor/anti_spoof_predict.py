@@ -1,5 +1,7 @@
 # ----------------- Anti-Spoofing Prediction -SCRFD -2 -----------------
+import argparse
 import os
+import time
 import cv2
 import torch
 import numpy as np
@@ -7,6 +9,7 @@ import torch.nn.functional as F
 from services.camera_processor.MiniFASNet import MiniFASNetV1, MiniFASNetV2, MiniFASNetV1SE, MiniFASNetV2SE
 import services.camera_processor.transform as trans
 from services.camera_processor.utility import get_kernel, parse_model_name
+from services.camera_processor.generate_patches import CropImage
 
 MODEL_MAPPING = {
     'MiniFASNetV1': MiniFASNetV1,
@@ -21,10 +24,12 @@ import cv2
 from services.camera_processor.scrfd import SCRFD  # Assuming SCRFD is implemented in scrfd.py
 
 class Detection:
-    def __init__(self, scrfd_model_path):
-        # Initialize SCRFD with the given model path
-        self.detector = SCRFD(model_file=scrfd_model_path)
-        self.detector.prepare(0)  # Use CUDA (ctx_id=0), set to -1 for CPU
+    def __init__(self, scrfd_model_path=None):
+        # Initialize SCRFD with the given model path (only needed for get_bbox)
+        self.detector = None
+        if scrfd_model_path is not None:
+            self.detector = SCRFD(model_file=scrfd_model_path)
+            self.detector.prepare(0)  # Use CUDA (ctx_id=0), set to -1 for CPU
         self.detector_confidence = 0.6
 
     def get_bbox(self, img):
@@ -38,23 +43,48 @@ class Detection:
         return [int(bbox[0]), int(bbox[1]), int(bbox[2] - bbox[0]), int(bbox[3] - bbox[1])]
 
 class AntiSpoofPredict(Detection):
-    def __init__(self, device_id, scrfd_model_path):
+    """
+    MiniFASNet liveness models, loaded once and kept in eval mode.
+
+    ``predict_batch`` crops every face at each model's scale, runs one forward pass per
+    model for the whole frame and fuses the softmax outputs into one label/score per face.
+    """
+
+    def __init__(self, device_id, scrfd_model_path=None, model_dir=None):
         # Initialize the Detection class with SCRFD
         super(AntiSpoofPredict, self).__init__(scrfd_model_path)
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-    def _load_model(self, model_path):
+        self.image_cropper = CropImage()
+        self._models = {}
+        if model_dir is not None:
+            for model_name in sorted(os.listdir(model_dir)):
+                if model_name.endswith(".pth"):
+                    self._load_model(os.path.join(model_dir, model_name))
+
+    @property
+    def model_names(self):
+        return [os.path.basename(model_path) for model_path in self._models]
+
+    def _build_model(self, model_path):
         # Define and load the MiniFASNet model
         model_name = os.path.basename(model_path)
         h_input, w_input, model_type, _ = parse_model_name(model_name)
-        self.kernel_size = get_kernel(h_input, w_input)
-        self.model = MODEL_MAPPING[model_type](conv6_kernel=self.kernel_size).to(self.device)
+        kernel_size = get_kernel(h_input, w_input)
+        model = MODEL_MAPPING[model_type](conv6_kernel=kernel_size).to(self.device)
 
         # Load model weights
         state_dict = torch.load(model_path, map_location=self.device)
         if 'module.' in list(state_dict.keys())[0]:
             state_dict = {k[7:]: v for k, v in state_dict.items()}
-        self.model.load_state_dict(state_dict)
+        model.load_state_dict(state_dict)
+        model.eval()
+        return model
+
+    def _load_model(self, model_path):
+        if model_path not in self._models:
+            self._models[model_path] = self._build_model(model_path)
+        self.model = self._models[model_path]
+        return self.model
 
     def predict(self, img, model_path):
         # Preprocess and predict using the MiniFASNet model
@@ -63,12 +93,86 @@ class AntiSpoofPredict(Detection):
         ])
         img = test_transform(img).unsqueeze(0).to(self.device)
         self._load_model(model_path)
-        self.model.eval()
         with torch.no_grad():
             result = self.model.forward(img)
-            result = F.softmax(result).cpu().numpy()
+            result = F.softmax(result, dim=1).cpu().numpy()
         return result
 
+    def predict_batch(self, frame, bboxes):
+        """
+        Liveness for all faces of a frame.
+
+        :param bboxes: (N, 4+) boxes in ``x1, y1, x2, y2`` order (SCRFD output).
+        :return: ``(labels, scores)``; label 1 means a real face and the score is the mean
+            probability of that label over all models.
+        """
+        num_faces = len(bboxes)
+        prediction = np.zeros((num_faces, 3), dtype=np.float32)
+        if num_faces == 0 or not self._models:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=np.float32)
+        # CropImage expects (x, y, width, height)
+        boxes = [[int(b[0]), int(b[1]), max(int(b[2] - b[0]), 1), max(int(b[3] - b[1]), 1)] for b in bboxes]
+        with torch.no_grad():
+            for model_path, model in self._models.items():
+                h_input, w_input, _, scale = parse_model_name(os.path.basename(model_path))
+                crops = [
+                    self.image_cropper.crop(frame, box, scale, w_input, h_input, crop=scale is not None)
+                    for box in boxes
+                ]
+                # Same input as transform.ToTensor: CHW float in the 0-255 range
+                batch = torch.from_numpy(np.stack(crops).transpose(0, 3, 1, 2).astype(np.float32)).to(self.device)
+                prediction += F.softmax(model(batch), dim=1).cpu().numpy()
+        labels = np.argmax(prediction, axis=1)
+        scores = prediction[np.arange(num_faces), labels] / len(self._models)
+        return labels, scores
+
+
+def benchmark(model_dir, faces=8, repeats=10):
+    """Per-face anti-spoofing cost: reload-per-call single-face path versus preloaded batches."""
+    predictor = AntiSpoofPredict(0, model_dir=model_dir)
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+    bboxes = [[100 + 120 * i, 200, 200 + 120 * i, 320] for i in range(faces)]
+    model_paths = list(predictor._models)
+    predictor.predict_batch(frame, bboxes)  # warm-up
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for x1, y1, x2, y2 in bboxes:
+            for model_path in model_paths:
+                # What the old code did: rebuild the model for every face and every model
+                h_input, w_input, _, scale = parse_model_name(os.path.basename(model_path))
+                img = predictor.image_cropper.crop(frame, [x1, y1, x2 - x1, y2 - y1], scale, w_input, h_input, crop=scale is not None)
+                model = predictor._build_model(model_path)
+                with torch.no_grad():
+                    model(torch.from_numpy(img.transpose(2, 0, 1).astype(np.float32)).unsqueeze(0).to(predictor.device))
+    reload_ms = (time.perf_counter() - start) * 1000 / (repeats * faces)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for bbox in bboxes:
+            predictor.predict_batch(frame, [bbox])
+    single_ms = (time.perf_counter() - start) * 1000 / (repeats * faces)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        predictor.predict_batch(frame, bboxes)
+    batched_ms = (time.perf_counter() - start) * 1000 / (repeats * faces)
+
+    print(f"models: {predictor.model_names}, faces per frame: {faces}, device: {predictor.device}")
+    print(f"reload per call : {reload_ms:8.2f} ms/face")
+    print(f"preloaded single: {single_ms:8.2f} ms/face")
+    print(f"preloaded batch : {batched_ms:8.2f} ms/face  (x{reload_ms / batched_ms:.1f} vs reload)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Anti-spoofing per-face cost benchmark")
+    parser.add_argument("--model_dir", type=str, default=os.path.join(os.path.dirname(__file__), "../models/anti_spoof_models"))
+    parser.add_argument("--faces", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+    benchmark(args.model_dir, faces=args.faces, repeats=args.repeats)
+
 
 
 
@@ -4,6 +4,10 @@
 # @Time          : 2021-05-04
 # @Function      : 
 
+import argparse
+import os
+import time
+
 import numpy as np
 import cv2
 import onnx
@@ -16,7 +20,7 @@ __all__ = [
 
 
 class ArcFaceONNX:
-    def __init__(self, model_file=None, session=None):
+    def __init__(self, model_file=None, session=None, batch_size=32):
         assert model_file is not None
         self.model_file = model_file
         self.session = session
@@ -56,16 +60,31 @@ class ArcFaceONNX:
         self.output_names = output_names
         assert len(self.output_names)==1
         self.output_shape = outputs[0].shape
+        # A fixed batch dimension (export-time 1) means faces have to go one by one
+        self.batch_size = batch_size if not isinstance(input_shape[0], int) else max(1, input_shape[0])
 
     def prepare(self, ctx_id, **kwargs):
         if ctx_id<0:
             self.session.set_providers(['CPUExecutionProvider'])
 
     def get(self, img, kps):
-        aimg = face_align.norm_crop(img, landmark=kps, image_size=self.input_size[0])
+        aimg = self.align(img, kps)
         embedding = self.get_feat(aimg).flatten()
         return embedding
 
+    def align(self, img, kps):
+        return face_align.norm_crop(img, landmark=kps, image_size=self.input_size[0])
+
+    def get_batch(self, img, kpss):
+        """
+        Embed every face with batched forward passes; returns an (F, D) array.
+        ``img`` is one image for all faces, or a list with the source image of each face.
+        """
+        if len(kpss) == 0:
+            return np.zeros((0, self.output_shape[1]), dtype=np.float32)
+        imgs = img if isinstance(img, (list, tuple)) else [img] * len(kpss)
+        return self.get_feat([self.align(im, kps) for im, kps in zip(imgs, kpss)])
+
     def compute_sim(self, feat1, feat2):
         from numpy.linalg import norm
         feat1 = feat1.ravel()
@@ -78,13 +97,45 @@ class ArcFaceONNX:
             imgs = [imgs]
         input_size = self.input_size
         
-        blob = cv2.dnn.blobFromImages(imgs, 1.0 / self.input_std, input_size,
-                                      (self.input_mean, self.input_mean, self.input_mean), swapRB=True)
-        net_out = self.session.run(self.output_names, {self.input_name: blob})[0]
-        return net_out
+        net_outs = []
+        # Chunk very large batches to bound the device memory of one run
+        for start in range(0, len(imgs), self.batch_size):
+            blob = cv2.dnn.blobFromImages(imgs[start:start + self.batch_size], 1.0 / self.input_std, input_size,
+                                          (self.input_mean, self.input_mean, self.input_mean), swapRB=True)
+            net_outs.append(self.session.run(self.output_names, {self.input_name: blob})[0])
+        return np.concatenate(net_outs) if len(net_outs) > 1 else net_outs[0]
 
     def forward(self, batch_data):
         blob = (batch_data - self.input_mean) / self.input_std
         net_out = self.session.run(self.output_names, {self.input_name: blob})[0]
         return net_out
 
+
+def benchmark(model_file, batch_sizes=(1, 2, 4, 8, 16, 32, 49), repeats=20):
+    """Per-face embedding latency on CPU: one run per face versus one batched run per frame."""
+    session = onnxruntime.InferenceSession(model_file, providers=['CPUExecutionProvider'])
+    rec = ArcFaceONNX(model_file, session=session, batch_size=max(batch_sizes))
+    rng = np.random.default_rng(0)
+    faces = [rng.integers(0, 255, (rec.input_size[1], rec.input_size[0], 3), dtype=np.uint8) for _ in range(max(batch_sizes))]
+    rec.get_feat(faces[:1])  # warm-up
+    print(f"{'faces':>5} {'per-face ms':>12} {'batched ms':>11} {'speedup':>8}")
+    for batch_size in batch_sizes:
+        batch = faces[:batch_size]
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for face in batch:
+                rec.get_feat(face)
+        single_ms = (time.perf_counter() - start) * 1000 / (repeats * batch_size)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            rec.get_feat(batch)
+        batched_ms = (time.perf_counter() - start) * 1000 / (repeats * batch_size)
+        print(f"{batch_size:>5} {single_ms:>12.2f} {batched_ms:>11.2f} {single_ms / batched_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="ArcFace batch size vs per-face latency benchmark (CPU)")
+    parser.add_argument("--model", type=str, default=os.path.join(os.path.dirname(__file__), "../models/buffalo_l/w600k_r50.onnx"))
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    benchmark(args.model, repeats=args.repeats)
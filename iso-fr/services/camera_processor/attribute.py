@@ -12,7 +12,7 @@ __all__ = [
 
 
 class Attribute:
-    def __init__(self, model_file=None, session=None):
+    def __init__(self, model_file=None, session=None, batch_size=32):
         assert model_file is not None
         self.model_file = model_file
         self.session = session
@@ -59,6 +59,9 @@ class Attribute:
             self.taskname = "genderage"
         else:
             self.taskname = "attribute_%d" % output_shape[1]
+        self.output_dim = output_shape[1]
+        # Models exported with a fixed batch dimension have to run face by face
+        self.batch_size = batch_size if not isinstance(input_shape[0], int) else max(1, input_shape[0])
 
     def prepare(self, ctx_id, **kwargs):
         if ctx_id < 0:
@@ -66,14 +69,18 @@ class Attribute:
         else:
             self.session.set_providers(["CUDAExecutionProvider"])
 
-    def get(self, img, face):
-
+    def _crop(self, img, face):
         w, h = (face[2] - face[0]), (face[3] - face[1])
         center = (face[2] + face[0]) / 2, (face[3] + face[1]) / 2
         rotate = 0
         _scale = self.input_size[0] / (max(w, h) * 1.5)
         # print('param:', img.shape, face, center, self.input_size, _scale, rotate)
         aimg, M = face_align.transform(img, center, self.input_size[0], _scale, rotate)
+        return aimg
+
+    def get(self, img, face):
+
+        aimg = self._crop(img, face)
         input_size = tuple(aimg.shape[0:2][::-1])
         # assert input_size==self.input_size
         blob = cv2.dnn.blobFromImage(
@@ -93,3 +100,33 @@ class Attribute:
             return genders, ages
         else:
             return pred
+
+    def get_batch(self, img, faces):
+        """
+        Run the attribute model once for all face boxes of ``img``, which may also be a
+        list with the source image of each face.
+
+        :return: ``(genders, ages)`` int arrays for the genderage model, otherwise the
+            (F, output_dim) prediction array.
+        """
+        if len(faces) == 0:
+            preds = np.zeros((0, self.output_dim), dtype=np.float32)
+        else:
+            imgs = img if isinstance(img, (list, tuple)) else [img] * len(faces)
+            aimgs = [self._crop(im, face) for im, face in zip(imgs, faces)]
+            preds = []
+            for start in range(0, len(aimgs), self.batch_size):
+                blob = cv2.dnn.blobFromImages(
+                    aimgs[start:start + self.batch_size],
+                    1.0 / self.input_std,
+                    self.input_size,
+                    (self.input_mean, self.input_mean, self.input_mean),
+                    swapRB=True,
+                )
+                preds.append(self.session.run(self.output_names, {self.input_name: blob})[0])
+            preds = np.concatenate(preds)
+        if self.taskname == "genderage":
+            genders = np.argmax(preds[:, :2], axis=1)
+            ages = np.round(preds[:, 2] * 100).astype(int)
+            return genders, ages
+        return preds
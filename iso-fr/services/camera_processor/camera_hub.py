@@ -0,0 +1,214 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+__all__ = [
+    "CameraHub",
+    "CameraPipeline",
+    "StreamViewer",
+]
+
+DEFAULT_JPEG_QUALITY = 95  # cv2.imencode default
+
+
+def encode_jpeg(frame: np.ndarray, max_width: Optional[int] = None, quality: int = DEFAULT_JPEG_QUALITY) -> bytes:
+    if max_width and frame.shape[1] > max_width:
+        height = max(1, int(frame.shape[0] * max_width / frame.shape[1]))
+        frame = cv2.resize(frame, (max_width, height), interpolation=cv2.INTER_AREA)
+    _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    return buffer.tobytes()
+
+
+class CameraPipeline:
+    """
+    One running capture + analysis pipeline per camera, whose encoded frames are shared by all viewers.
+
+    ``run(pipeline)`` is a generator yielding annotated BGR frames; it is driven by a
+    dedicated thread and must return once ``pipeline.stop_event`` is set. Each frame is
+    JPEG-encoded once at full size and default quality; other sizes/qualities asked for by
+    viewers are encoded on first request and shared for that frame. Viewers poll
+    ``wait_frame`` and always get the newest frame, so a slow HTTP client skips frames
+    instead of slowing down the camera or the other viewers.
+    """
+
+    def __init__(self, key: str, name: str, run: Callable[["CameraPipeline"], Iterator[np.ndarray]], url: Optional[str] = None) -> None:
+        self.key = key
+        self.name = name
+        self.url = url
+        self.stop_event = threading.Event()
+        self.viewers = 0
+        self.recorders = 0
+        self.finished = False
+        self.frames_published = 0
+        self._run = run
+        self._cond = threading.Condition()
+        self._frame: Optional[np.ndarray] = None
+        self._encoded: Dict[Tuple[Optional[int], int], bytes] = {}
+        self._encode_lock = threading.Lock()
+        self._seq = 0
+        self._thread = threading.Thread(target=self._loop, name=f"pipeline-{name}", daemon=True)
+
+    @property
+    def recording(self) -> bool:
+        """True while at least one subscriber asked for the camera to be recorded."""
+        return self.recorders > 0
+
+    def start(self) -> "CameraPipeline":
+        self._thread.start()
+        return self
+
+    def _loop(self) -> None:
+        frames = self._run(self)
+        try:
+            for frame in frames:
+                encoded = {(None, DEFAULT_JPEG_QUALITY): encode_jpeg(frame)}
+                with self._cond:
+                    self._frame = frame
+                    self._encoded = encoded
+                    self._seq += 1
+                    self.frames_published += 1
+                    self._cond.notify_all()
+                if self.stop_event.is_set():
+                    break
+        except Exception:
+            logging.exception(f"Camera pipeline {self.name} failed")
+        finally:
+            frames.close()
+            with self._cond:
+                self.finished = True
+                self._cond.notify_all()
+            logging.info(f"Camera pipeline {self.name} stopped")
+
+    def wait_frame(self, last_seq: int, timeout: float = 1.0, max_width: Optional[int] = None,
+                   quality: int = DEFAULT_JPEG_QUALITY) -> Tuple[int, Optional[bytes]]:
+        """
+        Wait for a frame newer than ``last_seq`` and return it as JPEG.
+
+        :return: ``(seq, jpeg)``; ``jpeg`` is None on timeout or once the pipeline finished.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > last_seq or self.finished, timeout)
+            if self._seq <= last_seq:
+                return last_seq, None
+            seq, frame, encoded = self._seq, self._frame, self._encoded
+        if max_width and max_width >= frame.shape[1]:
+            max_width = None
+        key = (max_width, int(quality))
+        with self._encode_lock:
+            jpeg = encoded.get(key)
+            if jpeg is None:
+                jpeg = encoded[key] = encode_jpeg(frame, max_width, quality)
+        return seq, jpeg
+
+
+class StreamViewer:
+    """
+    Pacing and encoding settings of one MJPEG client.
+
+    ``max_fps`` caps how often the client is sent a frame; the analysis pipeline keeps its
+    own rate. Frames published while the client was still receiving the previous one are
+    skipped, never queued. When writing a frame to the client takes longer than
+    ``slow_write_ms`` the JPEG quality steps down (to ``min_quality``) and it recovers
+    once the client keeps up again.
+    """
+
+    def __init__(self, max_fps: Optional[float] = None, max_width: Optional[int] = None, jpeg_quality: Optional[int] = None,
+                 min_quality: int = 40, slow_write_ms: float = 100.0) -> None:
+        self.min_interval = 1.0 / max_fps if max_fps and max_fps > 0 else 0.0
+        self.max_width = max_width if max_width and max_width > 0 else None
+        self.max_quality = int(min(max(jpeg_quality or DEFAULT_JPEG_QUALITY, 1), 100))
+        self.min_quality = min(min_quality, self.max_quality)
+        self.quality = self.max_quality
+        self.slow_write = slow_write_ms / 1000.0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.fps = 0.0
+        self.avg_write_ms = 0.0
+        self._last_sent: Optional[float] = None
+
+    def delay(self) -> float:
+        """Seconds to wait before the next frame to respect ``max_fps``."""
+        if self._last_sent is None or not self.min_interval:
+            return 0.0
+        return max(0.0, self._last_sent + self.min_interval - time.monotonic())
+
+    def on_frame(self, seq: int, last_seq: int) -> None:
+        if last_seq:
+            self.frames_skipped += max(0, seq - last_seq - 1)
+
+    def on_sent(self, write_seconds: float) -> None:
+        now = time.monotonic()
+        if self._last_sent is not None:
+            interval = now - self._last_sent
+            alpha = 1.0 if self.frames_sent == 1 else 0.1
+            self.fps += alpha * ((1.0 / interval if interval > 0 else 0.0) - self.fps)
+        self._last_sent = now
+        self.frames_sent += 1
+        alpha = 1.0 if self.frames_sent == 1 else 0.1
+        self.avg_write_ms += alpha * (write_seconds * 1000 - self.avg_write_ms)
+        # Shrink the frames of a client that cannot keep up, grow them back when it does
+        if write_seconds > self.slow_write:
+            self.quality = max(self.min_quality, self.quality - 10)
+        elif write_seconds < self.slow_write / 4:
+            self.quality = min(self.max_quality, self.quality + 5)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+            "fps": round(self.fps, 1),
+            "avg_write_ms": round(self.avg_write_ms, 1),
+            "jpeg_quality": self.quality,
+            "max_width": self.max_width,
+            "max_fps": round(1.0 / self.min_interval, 1) if self.min_interval else None,
+        }
+
+
+class CameraHub:
+    """
+    Reference-counted registry of camera pipelines, one per camera.
+
+    The first ``subscribe`` for a camera starts its pipeline from the URL it was given;
+    further viewers attach to the same one, whichever stream profile they asked for. The pipeline is stopped when ``unsubscribe`` drops the last viewer, and it
+    records while at least one subscriber that asked for recording is attached.
+    """
+
+    def __init__(self) -> None:
+        self._pipelines: Dict[str, CameraPipeline] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key: str, name: str, run: Callable[[CameraPipeline], Iterator[np.ndarray]], recording: bool = False,
+                  url: Optional[str] = None) -> CameraPipeline:
+        with self._lock:
+            pipeline = self._pipelines.get(key)
+            if pipeline is None or pipeline.finished or pipeline.stop_event.is_set():
+                pipeline = self._pipelines[key] = CameraPipeline(key, name, run, url).start()
+                logging.info(f"Started camera pipeline {name}")
+            pipeline.viewers += 1
+            if recording:
+                pipeline.recorders += 1
+            return pipeline
+
+    def unsubscribe(self, pipeline: CameraPipeline, recording: bool = False) -> None:
+        """Detach a subscriber; ``recording`` must match what it passed to ``subscribe``."""
+        with self._lock:
+            pipeline.viewers -= 1
+            if recording:
+                pipeline.recorders -= 1
+            if pipeline.viewers > 0:
+                return
+            pipeline.stop_event.set()
+            if self._pipelines.get(pipeline.key) is pipeline:
+                del self._pipelines[pipeline.key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "pipelines": len(self._pipelines),
+                "viewers": sum(pipeline.viewers for pipeline in self._pipelines.values()),
+                "recording": sum(pipeline.recording for pipeline in self._pipelines.values()),
+            }
@@ -13,7 +13,7 @@ import numpy as np
 import pandas as pd
 import datetime
 from pymongo import MongoClient
-from services.camera_processor.scrfd import SCRFD
+from services.camera_processor.scrfd import SCRFD, MultiScalePolicy
 from services.camera_processor.arcface_onnx import ArcFaceONNX
 # from transformers import AutoModelForImageClassification, AutoImageProcessor
 import torch
@@ -25,10 +25,12 @@ import logging
 import threading  # For handling the stop flag in a thread-safe manner
 from socketio_instance import notify_new_face
 from services.camera_processor.attribute import Attribute
+from services.camera_processor.gallery import FaceGallery
+from services.camera_processor.unknown_visitors import UnknownVisitorStore
 
 
 class CameraProcessor:
-    def __init__(self, device="cuda"):
+    def __init__(self, device="cuda", multiscale=None):
         self.device = torch.device(device)
         print(f"Using device: {self.device}")
         onnxruntime.set_default_logger_severity(3)
@@ -36,6 +38,9 @@ class CameraProcessor:
         detector_path = os.path.join(self.assets_dir, "det_10g.onnx")
         self.detector = SCRFD(detector_path)
         self.detector.prepare(0 if device == "cuda" else -1)
+        multiscale = dict(multiscale or {})
+        multiscale.pop("live_mode", None)  # Only used by the live Stream detector
+        self.detector.multiscale = MultiScalePolicy(**multiscale)
         rec_path = os.path.join(self.assets_dir, "w600k_r50.onnx")
         self.rec = ArcFaceONNX(rec_path)
         self.rec.prepare(0 if device == "cuda" else -1)
@@ -77,6 +82,12 @@ class CameraProcessor:
         self.db = self.client["isoai"]
         self.recognition_logs_collection = self.db["logs"]
         self.stop_flag = threading.Event()  # Initialize the stop flag
+        # Unknown faces are clustered here instead of being added to the known gallery
+        self.unknown_visitors = UnknownVisitorStore()
+
+    def get_detection_stats(self):
+        """How often autodetect ran its secondary scale and how often that found new faces."""
+        return self.detector.multiscale.stats()
 
     def init_log_file(self):
         if not os.path.exists(self.log_file):
@@ -125,7 +136,7 @@ class CameraProcessor:
         df.to_csv(self.camera_urls_file, index=False)
 
     def create_face_database(self, model, face_detector, image_folder):
-        database = {}
+        database = FaceGallery()
         for filename in os.listdir(image_folder):
             if filename.endswith((".jpg", ".png")):
                 name = osp.splitext(filename)[0]
@@ -135,7 +146,7 @@ class CameraProcessor:
                 if bboxes.shape[0] > 0:
                     kps = kpss[0]
                     embedding = model.get(image, kps)
-                    database[name] = embedding
+                    database.add(name, embedding)
         return database
 
     def get_emotion(self, face_image):
@@ -201,14 +212,14 @@ class CameraProcessor:
         return file_path
 
     def recog_face_and_emotion(
-        self, image: np.ndarray
+        self, image: np.ndarray, stream=None
     ) -> Tuple[
         List[np.ndarray], List[str], List[float], List[str], List[int], List[str]
     ]:
         if image is None or len(image.shape) < 2:
             return [], [], [], [], [], []
 
-        bboxes, kpss = self.detector.autodetect(image, max_num=49)
+        bboxes, kpss = self.detector.autodetect(image, max_num=49, stream=stream)
         if len(bboxes) == 0:
             return [], [], [], [], [], []
 
@@ -222,23 +233,20 @@ class CameraProcessor:
         for kps in kpss:
             embedding = self.rec.get(image, kps)
             embeddings.append(embedding)
+        match_keys, match_scores = self.database.match(np.stack(embeddings))
+        unknown = [
+            idx for idx in range(len(embeddings))
+            if match_keys[idx][0] is None or match_scores[idx, 0] < self.similarity_threshold
+        ]
+        visitors = dict(zip(unknown, self.unknown_visitors.assign(np.stack([embeddings[idx] for idx in unknown])) if unknown else []))
 
         for idx, embedding in enumerate(embeddings):
-            min_dist = float("inf")
-            best_match = None
+            best_match = match_keys[idx][0]
+            sim = float(match_scores[idx, 0])
             label = "Bilinmeyen"
             is_known = False
 
-            for name, db_embedding in self.database.items():
-                dist = np.linalg.norm(db_embedding - embedding)
-                if dist < min_dist:
-                    min_dist = dist
-                    best_match = name
-
-            sim = self.rec.compute_sim(
-                embedding, self.database.get(best_match, np.zeros_like(embedding))
-            )
-            if sim >= self.similarity_threshold:
+            if best_match is not None and sim >= self.similarity_threshold:
                 label = best_match
                 is_known = True
 
@@ -246,9 +254,9 @@ class CameraProcessor:
             x1, y1, x2, y2 = map(int, bbox[:4])
             face_image = image[y1:y2, x1:x2]
 
+            new_visit = False
             if not is_known:
-                label = f"x-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
-                self.database[label] = embedding
+                label, new_visit = visitors[idx]
 
             labels.append(label)
             sims.append(sim)
@@ -263,9 +271,11 @@ class CameraProcessor:
             emotion = "emotion"
             emotions.append(emotion)
 
-            self.save_and_log_face(
-                face_image, label, sim, emotion, gender, age, is_known
-            )
+            # Unknown visitors are logged once per visit
+            if is_known or new_visit:
+                self.save_and_log_face(
+                    face_image, label, sim, emotion, gender, age, is_known
+                )
 
         return bboxes, labels, sims, emotions, genders, ages
 
@@ -301,7 +311,7 @@ class CameraProcessor:
                     break
 
             for bbox, label, sim, emotion, gender, age in zip(
-                *self.recog_face_and_emotion(frame)
+                *self.recog_face_and_emotion(frame, stream=stream_id)
             ):
                 x1, y1, x2, y2 = map(int, bbox[:4])
                 cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 4)
@@ -350,7 +360,7 @@ class CameraProcessor:
                 return
 
         for bbox, label, sim, emotion, gender, age in zip(
-            *self.recog_face_and_emotion(frame)
+            *self.recog_face_and_emotion(frame, stream="local")
         ):
             x1, y1, x2, y2 = map(int, bbox[:4])
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 4)
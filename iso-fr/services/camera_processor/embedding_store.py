@@ -0,0 +1,140 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+__all__ = [
+    "EmbeddingStore",
+    "content_hash",
+    "file_hash",
+]
+
+MANIFEST_FILE = "manifest.json"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_hash(paths: Iterable[str], chunk_size: int = 1 << 20) -> str:
+    """Hash the contents of one or more model files, in order."""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """
+    On-disk cache of enrollment embeddings so a restart does not re-embed every person.
+
+    An ``embeddings-<generation>.npy`` matrix holds one float32 row per person and is
+    memory-mapped on load; ``manifest.json`` names the current matrix file and maps each
+    personnel id to its row, label, photo content hash and the HTTP ETag of the photo.
+    The manifest also records a hash of the detection and recognition models: when the
+    models change, every cached vector is considered stale.
+    """
+
+    def __init__(self, directory: str, model_hash: str) -> None:
+        self.directory = directory
+        self.model_hash = model_hash
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._dirty = False
+
+    def load(self) -> int:
+        """Load the cached vectors; returns how many entries are usable with the current models."""
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return 0
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            matrix = np.load(os.path.join(self.directory, manifest["embeddings_file"]), mmap_mode="r")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not read embedding cache in {self.directory}: {e}")
+            return 0
+        if manifest.get("model_hash") != self.model_hash:
+            print("Embedding cache was built with different models, ignoring it.")
+            return 0
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            for personnel_id, entry in manifest.get("entries", {}).items():
+                row = entry.pop("row")
+                if 0 <= row < matrix.shape[0]:
+                    self._entries[personnel_id] = entry
+                    self._vectors[personnel_id] = matrix[row]
+            return len(self._entries)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, personnel_id: str) -> Optional[dict]:
+        """Return ``{"label", "image_hash", "etag", "embedding"}`` for a cached person."""
+        with self._lock:
+            entry = self._entries.get(personnel_id)
+            if entry is None:
+                return None
+            return dict(entry, embedding=self._vectors[personnel_id])
+
+    def put(self, personnel_id: str, embedding: np.ndarray, label: str, image_hash: str, etag: Optional[str] = None) -> None:
+        with self._lock:
+            self._entries[personnel_id] = {"label": label, "image_hash": image_hash, "etag": etag}
+            self._vectors[personnel_id] = np.asarray(embedding, dtype=np.float32).ravel()
+            self._dirty = True
+
+    def update_metadata(self, personnel_id: str, **fields) -> None:
+        with self._lock:
+            entry = self._entries.get(personnel_id)
+            if entry is not None and any(entry.get(k) != v for k, v in fields.items()):
+                entry.update(fields)
+                self._dirty = True
+
+    def delete(self, personnel_id: str) -> bool:
+        with self._lock:
+            if self._entries.pop(personnel_id, None) is None:
+                return False
+            del self._vectors[personnel_id]
+            self._dirty = True
+            return True
+
+    def flush(self) -> None:
+        """Rewrite the matrix and manifest atomically if anything changed since the last flush."""
+        with self._lock:
+            if not self._dirty:
+                return
+            ids = list(self._entries)
+            if ids:
+                matrix = np.stack([self._vectors[personnel_id] for personnel_id in ids]).astype(np.float32)
+            else:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+            manifest = {
+                "model_hash": self.model_hash,
+                "entries": {personnel_id: dict(self._entries[personnel_id], row=row) for row, personnel_id in enumerate(ids)},
+            }
+            embeddings_file = f"embeddings-{time.time_ns()}.npy"
+            manifest["embeddings_file"] = embeddings_file
+            os.makedirs(self.directory, exist_ok=True)
+            manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+            with open(os.path.join(self.directory, embeddings_file), "wb") as f:
+                np.save(f, matrix)
+            with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            # Swapping the manifest is the commit point; a crash before it keeps the old pair
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+            for stale in glob.glob(os.path.join(self.directory, "embeddings-*.npy")):
+                if os.path.basename(stale) != embeddings_file:
+                    os.remove(stale)
+            # Rows now live in fresh memory instead of the replaced memory map
+            self._vectors = {personnel_id: matrix[row] for row, personnel_id in enumerate(ids)}
+            self._dirty = False
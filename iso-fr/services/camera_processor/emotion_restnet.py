@@ -180,4 +180,18 @@ def pth_processing(fp, device = torch.device("cuda" if torch.cuda.is_available()
         img = torch.unsqueeze(img, 0).to(device)  # Move to GPU
         return img
 
-    return get_img_torch(fp)
\ No newline at end of file
+    return get_img_torch(fp)
+
+EMOTION_MEAN_BGR = np.array([91.4953, 103.8827, 131.0912], dtype=np.float32)
+
+
+def pth_processing_batch(face_images, device = torch.device("cuda" if torch.cuda.is_available() else "cpu")):
+    """
+    Same input as ``pth_processing`` for a list of BGR crops, built with cv2/NumPy as one
+    (N, 3, 224, 224) tensor and moved to ``device`` in a single transfer.
+    """
+    # INTER_NEAREST_EXACT samples like PIL's NEAREST resize used by pth_processing
+    batch = np.stack([cv2.resize(img, (224, 224), interpolation=cv2.INTER_NEAREST_EXACT) for img in face_images])
+    batch = batch.astype(np.float32) - EMOTION_MEAN_BGR
+    batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+    return torch.from_numpy(batch).to(device)
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+import torch
+
+from services.camera_processor.emotion_restnet import pth_processing_batch
+
+__all__ = [
+    "EmotionTemporalState",
+]
+
+
+class _Track:
+    __slots__ = ("features", "frames_since_feature", "last_output", "last_seen")
+
+    def __init__(self, seq_len: int) -> None:
+        self.features = deque(maxlen=seq_len)
+        self.frames_since_feature = 0
+        self.last_output: Optional[np.ndarray] = None
+        self.last_seen = time.monotonic()
+
+
+class EmotionTemporalState:
+    """
+    Per-face emotion history for the ResNet50 + LSTM model.
+
+    Every track keeps a ring buffer of its last ``seq_len`` backbone features (on the
+    model device). The backbone only runs for a track every ``stride`` frames; in between
+    the last LSTM output is reused. When a new feature arrives the LSTM is evaluated on
+    the real sequence, left-padded with the oldest feature until the buffer is full.
+    Tracks not seen for ``ttl`` seconds are dropped.
+    """
+
+    def __init__(self, backbone, lstm, device, seq_len: int = 10, stride: int = 3, ttl: float = 5.0) -> None:
+        self.backbone = backbone
+        self.lstm = lstm
+        self.device = device
+        self.seq_len = seq_len
+        self.stride = max(1, stride)
+        self.ttl = ttl
+        self._tracks: Dict[Hashable, _Track] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def predict(self, face_images: List[np.ndarray], keys: List[Optional[Hashable]]) -> np.ndarray:
+        """
+        Emotion probabilities (F, 7) for the BGR face crops of one frame.
+
+        :param keys: Track key per face; ``None`` means no history (single-frame prediction).
+        """
+        outputs = np.zeros((len(face_images), 7), dtype=np.float32)
+        if not face_images:
+            return outputs
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            tracks: List[Optional[_Track]] = []
+            for key in keys:
+                track = None
+                if key is not None:
+                    track = self._tracks.get(key)
+                    if track is None:
+                        track = self._tracks[key] = _Track(self.seq_len)
+                    track.last_seen = now
+                tracks.append(track)
+
+            # Faces whose history is too fresh reuse the previous LSTM output
+            run = []
+            for i, track in enumerate(tracks):
+                if track is None or track.last_output is None or track.frames_since_feature + 1 >= self.stride:
+                    run.append(i)
+                else:
+                    track.frames_since_feature += 1
+                    outputs[i] = track.last_output
+            if not run:
+                return outputs
+
+            with torch.inference_mode():
+                face_tensor = pth_processing_batch([face_images[i] for i in run], self.device)
+                features = torch.nn.functional.relu(self.backbone.extract_features(face_tensor))
+                sequences = []
+                for feature, i in zip(features, run):
+                    track = tracks[i]
+                    if track is None:
+                        sequences.append(feature.unsqueeze(0).expand(self.seq_len, -1))
+                        continue
+                    track.features.append(feature)
+                    track.frames_since_feature = 0
+                    history = list(track.features)
+                    history = [history[0]] * (self.seq_len - len(history)) + history
+                    sequences.append(torch.stack(history))
+                emotion_output = self.lstm(torch.stack(sequences)).cpu().numpy()
+
+            for row, i in enumerate(run):
+                outputs[i] = emotion_output[row]
+                if tracks[i] is not None:
+                    tracks[i].last_output = emotion_output[row]
+        return outputs
+
+    def forget(self, key: Hashable) -> None:
+        with self._lock:
+            self._tracks.pop(key, None)
+
+    def _prune(self, now: float) -> None:
+        stale = [key for key, track in self._tracks.items() if now - track.last_seen > self.ttl]
+        for key in stale:
+            del self._tracks[key]
@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+__all__ = [
+    "LatestFrameReader",
+]
+
+
+class LatestFrameReader:
+    """
+    Drains a ``cv2.VideoCapture`` on its own thread and keeps only the newest frame.
+
+    The consumer always gets the freshest frame, so a slow recognition loop skips frames
+    instead of falling behind the camera. Frames overwritten before anyone read them are
+    counted as dropped; ``mark_done`` records the capture-to-output latency of a frame.
+    """
+
+    def __init__(self, source: str, name: Optional[str] = None) -> None:
+        self.source = source
+        self.name = name or str(source)
+        self.cap = cv2.VideoCapture(source)
+        self._cond = threading.Condition()
+        self._frame: Optional[np.ndarray] = None
+        self._captured_at = 0.0
+        self._seq = 0
+        self._consumed_seq = 0
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+        self.last_latency_ms = 0.0
+        self.avg_latency_ms = 0.0
+
+    def is_opened(self) -> bool:
+        return self.cap.isOpened()
+
+    def start(self) -> "LatestFrameReader":
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"capture-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while self._running:
+            ret, frame = self.cap.read()
+            captured_at = time.monotonic()
+            with self._cond:
+                if not ret:
+                    logging.error(f"Error reading frame from {self.name}")
+                    self._running = False
+                    self._cond.notify_all()
+                    break
+                if self._seq > self._consumed_seq:
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._captured_at = captured_at
+                self._seq += 1
+                self.frames_read += 1
+                self._cond.notify_all()
+        self.cap.release()
+
+    def read(self, timeout: float = 5.0) -> Tuple[bool, Optional[np.ndarray], float]:
+        """
+        Wait for a frame newer than the last one returned.
+
+        :return: ``(ok, frame, captured_at)``; ``ok`` is False once the capture ended or
+            no new frame arrived within ``timeout`` seconds.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._consumed_seq or not self._running, timeout):
+                return False, None, 0.0
+            if self._seq == self._consumed_seq:
+                return False, None, 0.0
+            self._consumed_seq = self._seq
+            return True, self._frame, self._captured_at
+
+    def mark_done(self, captured_at: float) -> None:
+        """Record that the frame captured at ``captured_at`` left the pipeline."""
+        latency_ms = (time.monotonic() - captured_at) * 1000
+        self.frames_processed += 1
+        self.last_latency_ms = latency_ms
+        # Exponential moving average over roughly the last 50 frames
+        alpha = 1.0 if self.frames_processed == 1 else 0.02
+        self.avg_latency_ms += alpha * (latency_ms - self.avg_latency_ms)
+
+    def stop(self) -> None:
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "frames_read": self.frames_read,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "drop_rate": round(self.frames_dropped / self.frames_read, 3) if self.frames_read else 0.0,
+            "last_latency_ms": round(self.last_latency_ms, 1),
+            "avg_latency_ms": round(self.avg_latency_ms, 1),
+        }
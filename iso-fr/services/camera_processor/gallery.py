@@ -0,0 +1,360 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+__all__ = [
+    "FaceGallery",
+    "l2_normalize",
+]
+
+
+def l2_normalize(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class FaceGallery:
+    """
+    Enrolled face embeddings kept in one contiguous, L2-normalized float32 tensor.
+
+    Every identity (``keys[i]`` / ``labels[i]``) owns up to ``max_templates`` templates:
+    slot 0 is the enrollment photo and the other slots hold camera crops added with
+    ``add_template``. The tensor is laid out slot-major, ``(max_templates, capacity, dim)``,
+    so every face of a frame is matched against all templates of all identities with one
+    batched matrix multiply, and the per-identity score is the max (``aggregate="max"``)
+    or the mean of the two best (``aggregate="top2"``) template similarities.
+
+    An optional approximate index (see ``ann_index.IVFIndex``) can be attached for very
+    large galleries; it holds every template (``key`` for the enrollment one, ``key#slot``
+    for harvested ones), is kept in sync on every change and is used for ``match`` once the
+    gallery holds at least ``index_min_size`` entries. Its hits only pick the candidate
+    identities, which are then scored exactly over all their templates. The index is
+    retrained when its lists grow more than ``index_max_imbalance`` times unbalanced.
+    """
+
+    def __init__(self, dim: int = 512, capacity: int = 1024, max_templates: int = 1, aggregate: str = "max",
+                 redundant_similarity: float = 0.9) -> None:
+        if aggregate not in ("max", "top2"):
+            raise ValueError(f"Unknown template aggregate: {aggregate}")
+        self.dim = dim
+        self.max_templates = max(1, max_templates)
+        self.aggregate = aggregate
+        self.redundant_similarity = redundant_similarity
+        self._lock = threading.RLock()
+        self._templates = np.zeros((self.max_templates, capacity, dim), dtype=np.float32)
+        self._counts = np.zeros(capacity, dtype=np.int32)
+        self._keys: List[str] = []
+        self._labels: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self.templates_added = 0
+        self.templates_rejected = 0
+        self.templates_evicted = 0
+        self.index = None
+        self.index_min_size = 0
+        self.index_max_imbalance = 0.0
+        self.index_retrains = 0
+        self._index_trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._keys)
+
+    def vectors(self) -> np.ndarray:
+        """Enrollment template of every identity, in ``keys()`` order."""
+        with self._lock:
+            return self._templates[0, :len(self._keys)].copy()
+
+    def attach_index(self, index, min_size: int = 0, max_imbalance: float = 0.0) -> None:
+        """Use ``index`` for lookups and bring it in sync with the gallery contents."""
+        with self._lock:
+            self.index = index
+            self.index_min_size = min_size
+            self.index_max_imbalance = max_imbalance
+            self._index_trained_size = len(index)
+            self._sync_index()
+
+    @staticmethod
+    def _index_key(key: str, slot: int) -> str:
+        return key if slot == 0 else f"{key}#{slot}"
+
+    def _index_owner(self, index_key: str) -> str:
+        return index_key if index_key in self._rows else index_key.rpartition("#")[0]
+
+    def _indexed_templates(self) -> Dict[str, np.ndarray]:
+        return {
+            self._index_key(key, slot): self._templates[slot, row]
+            for key, row in self._rows.items() for slot in range(int(self._counts[row]))
+        }
+
+    def _sync_index(self) -> None:
+        # Train lazily: centroids fitted on a handful of people would be useless later on
+        index = self.index
+        if not index.is_trained:
+            if not self._keys or len(self._keys) < self.index_min_size:
+                return
+            self._train_index()
+            return
+        wanted = self._indexed_templates()
+        for key in [key for key in index.keys() if key not in wanted]:
+            index.remove(key)
+        for key, vector in wanted.items():
+            if key not in index:
+                index.add(key, vector)
+        self._maybe_retrain_index()
+
+    def _train_index(self) -> None:
+        templates = self._indexed_templates()
+        self.index.train(np.stack(list(templates.values())))
+        for key, vector in templates.items():
+            self.index.add(key, vector)
+        self._index_trained_size = len(templates)
+
+    def _maybe_retrain_index(self) -> None:
+        # Centroids never move on insert, so lists drift apart as the roster changes;
+        # the size check keeps data that is inherently clustered from retraining every time
+        index = self.index
+        if self.index_max_imbalance <= 0 or len(index) < 1.1 * self._index_trained_size:
+            return
+        imbalance = index.imbalance()
+        if imbalance > self.index_max_imbalance:
+            print(f"ANN index lists are {imbalance:.1f}x unbalanced, retraining on {len(index)} templates")
+            self._train_index()
+            self.index_retrains += 1
+
+    def _index_add(self, key: str, slot: int, embedding: np.ndarray) -> None:
+        if self.index is None:
+            return
+        if self.index.is_trained:
+            self.index.add(self._index_key(key, slot), embedding)
+            self._maybe_retrain_index()
+        else:
+            self._sync_index()
+
+    def _index_remove(self, key: str, slots: range) -> None:
+        if self.index is not None and self.index.is_trained:
+            for slot in slots:
+                self.index.remove(self._index_key(key, slot))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Enrollment template of ``key``."""
+        with self._lock:
+            row = self._rows.get(key)
+            return None if row is None else self._templates[0, row].copy()
+
+    def templates(self, key: str) -> Optional[np.ndarray]:
+        """All templates of ``key`` as a (T, D) array, enrollment first."""
+        with self._lock:
+            row = self._rows.get(key)
+            return None if row is None else self._templates[:self._counts[row], row].copy()
+
+    def label(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._rows.get(key)
+            return None if row is None else self._labels[row]
+
+    def add(self, key: str, embedding: np.ndarray, label: Optional[str] = None) -> None:
+        """Insert ``key`` or replace its enrollment template; harvested templates are kept."""
+        embedding = l2_normalize(np.ravel(embedding))
+        with self._lock:
+            if not self._keys and embedding.shape[0] != self.dim:
+                self.dim = embedding.shape[0]
+                self._templates = np.zeros((self.max_templates, self._templates.shape[1], self.dim), dtype=np.float32)
+            row = self._rows.get(key)
+            if row is None:
+                row = len(self._keys)
+                if row == self._templates.shape[1]:
+                    capacity = max(1, row * 2)
+                    grown = np.zeros((self.max_templates, capacity, self.dim), dtype=np.float32)
+                    grown[:, :row] = self._templates[:, :row]
+                    self._templates = grown
+                    counts = np.zeros(capacity, dtype=np.int32)
+                    counts[:row] = self._counts[:row]
+                    self._counts = counts
+                self._keys.append(key)
+                self._labels.append(label)
+                self._rows[key] = row
+                self._counts[row] = 1
+            else:
+                self._labels[row] = label
+            self._templates[0, row] = embedding
+            self._index_add(key, 0, embedding)
+
+    def add_template(self, key: str, embedding: np.ndarray, anchor_similarity: float = 0.0) -> bool:
+        """
+        Add a camera crop of ``key`` as an extra template.
+
+        The crop is rejected when it is further than ``anchor_similarity`` from the
+        enrollment template (so templates cannot drift towards someone else) or closer than
+        ``redundant_similarity`` to an existing template (it would add nothing). When all
+        slots are taken, the most redundant harvested template - the one most similar to
+        another template - is evicted, or the crop is rejected if it is the most redundant.
+
+        :return: True if the template was stored.
+        """
+        if self.max_templates < 2:
+            return False
+        embedding = l2_normalize(np.ravel(embedding))
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None or embedding.shape[0] != self.dim:
+                return False
+            count = int(self._counts[row])
+            sims = self._templates[:count, row] @ embedding
+            if sims[0] < anchor_similarity or sims.max() >= self.redundant_similarity:
+                self.templates_rejected += 1
+                return False
+            if count < self.max_templates:
+                self._templates[count, row] = embedding
+                self._counts[row] = count + 1
+                self.templates_added += 1
+                self._index_add(key, count, embedding)
+                return True
+            # Redundancy of each harvested slot and of the candidate: its best similarity to another template
+            candidates = np.concatenate([self._templates[:, row], embedding[None]])
+            pairwise = candidates @ candidates.T
+            np.fill_diagonal(pairwise, -np.inf)
+            redundancy = pairwise.max(axis=1)
+            evict = 1 + int(np.argmax(redundancy[1:]))
+            if evict == count:
+                self.templates_rejected += 1
+                return False
+            self._templates[evict, row] = embedding
+            self.templates_added += 1
+            self.templates_evicted += 1
+            self._index_add(key, evict, embedding)
+            return True
+
+    def clear_templates(self, key: str) -> bool:
+        """Drop every harvested template of ``key``, keeping the enrollment one."""
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return False
+            self._index_remove(key, range(1, int(self._counts[row])))
+            self._counts[row] = 1
+            return True
+
+    def remove(self, key: str) -> bool:
+        """Drop ``key`` by moving the last identity into its slot, keeping the tensor dense."""
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is None:
+                return False
+            self._index_remove(key, range(int(self._counts[row])))
+            last = len(self._keys) - 1
+            if row != last:
+                self._templates[:, row] = self._templates[:, last]
+                self._counts[row] = self._counts[last]
+                self._keys[row] = self._keys[last]
+                self._labels[row] = self._labels[last]
+                self._rows[self._keys[row]] = row
+            self._counts[last] = 0
+            self._keys.pop()
+            self._labels.pop()
+            return True
+
+    def rename(self, old_key: str, new_key: str, label: Optional[str] = None) -> bool:
+        with self._lock:
+            row = self._rows.pop(old_key, None)
+            if row is None:
+                return False
+            self._keys[row] = new_key
+            self._rows[new_key] = row
+            if label is not None:
+                self._labels[row] = label
+            if self.index is not None and self.index.is_trained:
+                for slot in range(int(self._counts[row])):
+                    self.index.remove(self._index_key(old_key, slot))
+                    self.index.add(self._index_key(new_key, slot), self._templates[slot, row])
+            return True
+
+    def _identity_scores(self, queries: np.ndarray, rows) -> np.ndarray:
+        # (F, N) similarity of every face to every identity in ``rows`` (a slice or row indices)
+        counts = self._counts[rows]
+        slots = int(counts.max())
+        if slots == 1:
+            return queries @ self._templates[0, rows].T
+        sims = np.matmul(self._templates[:slots, rows], queries.T)  # (slots, N, F)
+        unused = np.arange(slots)[:, None] >= counts[None, :]
+        sims[unused] = -np.inf
+        if self.aggregate == "max":
+            return sims.max(axis=0).T
+        best_two = np.partition(sims, slots - 2, axis=0)[slots - 2:]
+        # Identities with a single template keep its similarity
+        second, first = best_two[0], best_two[1]
+        return np.where(np.isfinite(second), (first + second) / 2, first).T
+
+    def match(self, embeddings: np.ndarray, top_k: int = 1) -> Tuple[List[List[Optional[str]]], np.ndarray]:
+        """
+        Match a batch of face embeddings against the gallery.
+
+        :param embeddings: Array of shape (F, D) (or a single D vector).
+        :param top_k: Number of identities to return per face.
+        :return: ``(keys, scores)`` where ``keys[i]`` lists the top-k gallery keys for face
+            ``i`` and ``scores`` is an (F, top_k) array of per-identity cosine scores, best first.
+            Missing candidates (small or empty gallery) are ``None`` with a score of 0.
+        """
+        queries = l2_normalize(np.atleast_2d(embeddings))
+        num_faces = queries.shape[0]
+        keys: List[List[Optional[str]]] = [[None] * top_k for _ in range(num_faces)]
+        scores = np.zeros((num_faces, top_k), dtype=np.float32)
+        if num_faces == 0:
+            return keys, scores
+
+        with self._lock:
+            size = len(self._keys)
+            if size == 0:
+                return keys, scores
+            if self.index is not None and self.index.is_trained and size >= self.index_min_size:
+                return self._match_index(queries, top_k)
+            sims = self._identity_scores(queries, slice(0, size))
+            k = min(top_k, size)
+            if k == 1:
+                best = np.argmax(sims, axis=1)[:, None]
+            else:
+                best = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+                order = np.argsort(-np.take_along_axis(sims, best, axis=1), axis=1)
+                best = np.take_along_axis(best, order, axis=1)
+            scores[:, :k] = np.take_along_axis(sims, best, axis=1)
+            for i in range(num_faces):
+                keys[i][:k] = [self._keys[j] for j in best[i]]
+        return keys, scores
+
+    def _match_index(self, queries: np.ndarray, top_k: int) -> Tuple[List[List[Optional[str]]], np.ndarray]:
+        # Enough hits to still find top_k identities when each of them hits with every template
+        hits, _ = self.index.search(queries, top_k * self.max_templates)
+        keys: List[List[Optional[str]]] = []
+        scores = np.zeros((queries.shape[0], top_k), dtype=np.float32)
+        for i, face_hits in enumerate(hits):
+            owners = dict.fromkeys(self._index_owner(hit) for hit in face_hits if hit is not None)
+            rows = np.array([self._rows[owner] for owner in owners if owner in self._rows], dtype=np.int64)
+            face_keys: List[Optional[str]] = [None] * top_k
+            if len(rows):
+                sims = self._identity_scores(queries[i:i + 1], rows)[0]
+                best = np.argsort(-sims)[:top_k]
+                face_keys[:len(best)] = [self._keys[rows[j]] for j in best]
+                scores[i, :len(best)] = sims[best]
+            keys.append(face_keys)
+        return keys, scores
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            size = len(self._keys)
+            templates = int(self._counts[:size].sum())
+            return {
+                "identities": size,
+                "templates": templates,
+                "avg_templates": round(templates / size, 2) if size else 0.0,
+                "templates_added": self.templates_added,
+                "templates_rejected": self.templates_rejected,
+                "templates_evicted": self.templates_evicted,
+                "index_retrains": self.index_retrains,
+            }
@@ -0,0 +1,107 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+__all__ = [
+    "InferenceScheduler",
+]
+
+
+class InferenceScheduler:
+    """
+    Single worker that micro-batches frames from every active stream.
+
+    Streams call ``submit`` and block until their frame has been processed. The worker
+    takes the first pending frame, keeps collecting until ``max_batch`` frames are queued
+    or ``max_wait_ms`` has passed, and hands the whole batch to ``process_batch``. With N
+    cameras the models see one call per batch instead of N interleaved single-image calls.
+    """
+
+    def __init__(self, process_batch: Callable[[List[np.ndarray], List[str]], List], max_batch: int = 8, max_wait_ms: float = 10.0) -> None:
+        self.process_batch = process_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+        self.busy_seconds = 0.0
+        self.failed_batches = 0
+        self.failed_frames = 0
+        self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame: np.ndarray, camera_name: Optional[str], timeout: Optional[float] = None):
+        """Queue one frame and wait for its ``_get_attributes``-style result."""
+        future: Future = Future()
+        self._queue.put((frame, camera_name, future))
+        return future.result(timeout)
+
+    def _collect(self) -> List:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            frames = [frame for frame, _, _ in batch]
+            camera_names = [camera_name for _, camera_name, _ in batch]
+            start = time.monotonic()
+            try:
+                results = self.process_batch(frames, camera_names)
+            except Exception:
+                logging.exception("Inference batch failed, retrying its frames one by one")
+                with self._stats_lock:
+                    self.failed_batches += 1
+                self._retry_frames(batch)
+                continue
+            with self._stats_lock:
+                self.batches += 1
+                self.frames += len(batch)
+                self.busy_seconds += time.monotonic() - start
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _retry_frames(self, batch: List) -> None:
+        # A bad frame must only fail its own stream, not every camera that shared the batch
+        for frame, camera_name, future in batch:
+            start = time.monotonic()
+            try:
+                result = self.process_batch([frame], [camera_name])[0]
+            except Exception as e:
+                logging.exception(f"Inference failed for a frame of {camera_name}")
+                with self._stats_lock:
+                    self.failed_frames += 1
+                future.set_exception(e)
+                continue
+            with self._stats_lock:
+                self.batches += 1
+                self.frames += 1
+                self.busy_seconds += time.monotonic() - start
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "frames": self.frames,
+                "avg_batch_size": round(self.frames / self.batches, 2) if self.batches else 0.0,
+                "avg_batch_ms": round(self.busy_seconds * 1000 / self.batches, 1) if self.batches else 0.0,
+                "pending": self._queue.qsize(),
+                "failed_batches": self.failed_batches,
+                "failed_frames": self.failed_frames,
+            }
@@ -0,0 +1,77 @@
+import threading
+import time
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+__all__ = [
+    "MotionGate",
+]
+
+
+class MotionGate:
+    """
+    Cheap per-camera check that decides whether a frame is worth running the detector on.
+
+    Frames are shrunk to ``width`` pixels, converted to gray and blurred, then compared
+    with the frame of the last detection. The gate opens when more than ``min_area`` of
+    the pixels changed by over ``pixel_threshold`` gray levels, and at least every
+    ``force_interval`` seconds regardless, so a person standing still is re-checked.
+    Comparing against the last *detected* frame (not the previous one) means slow drifts
+    add up until they open the gate once and reset the reference.
+    """
+
+    def __init__(self, width: int = 160, pixel_threshold: int = 25, min_area: float = 0.002, force_interval: float = 5.0) -> None:
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.force_interval = force_interval
+        self._reference: Optional[np.ndarray] = None
+        self._last_detection = 0.0
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+        self.forced = 0
+        self.last_changed_area = 0.0
+
+    def _small(self, frame: np.ndarray) -> np.ndarray:
+        height = max(1, int(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def should_detect(self, frame: np.ndarray) -> bool:
+        """True when ``frame`` changed enough since the last detection, or the safety interval expired."""
+        small = self._small(frame)
+        now = time.monotonic()
+        with self._lock:
+            self.frames += 1
+            if self._reference is None or self._reference.shape != small.shape:
+                changed = 1.0
+            else:
+                diff = cv2.absdiff(small, self._reference)
+                changed = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+            self.last_changed_area = changed
+            if changed < self.min_area:
+                if now - self._last_detection < self.force_interval:
+                    self.skipped += 1
+                    return False
+                self.forced += 1
+            self._reference = small
+            self._last_detection = now
+            return True
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "skipped": self.skipped,
+                "forced": self.forced,
+                "skip_percent": round(100.0 * self.skipped / self.frames, 1) if self.frames else 0.0,
+                "last_changed_area": round(self.last_changed_area, 4),
+                "pixel_threshold": self.pixel_threshold,
+                "min_area": self.min_area,
+                "force_interval": self.force_interval,
+            }
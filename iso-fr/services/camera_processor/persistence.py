@@ -0,0 +1,172 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+__all__ = [
+    "PersistenceWorker",
+]
+
+_STOP = object()
+
+
+class PersistenceWorker:
+    """
+    Background writer for recognition images and log records.
+
+    The frame loop only enqueues: images are encoded and written, and log records are
+    announced through ``notify`` and stored with ``insert_many``, on the worker thread.
+    Records are flushed once ``batch_size`` are pending or the oldest one waited
+    ``flush_interval`` seconds. The queue holds at most ``max_queue`` items; when it is
+    full, images are dropped immediately and records wait up to ``put_timeout`` seconds
+    before being dropped, and both are counted in ``stats``.
+    """
+
+    def __init__(self, collection, notify: Optional[Callable[[Dict], None]] = None, max_queue: int = 1000,
+                 batch_size: int = 50, flush_interval: float = 1.0, put_timeout: float = 0.5) -> None:
+        self.collection = collection
+        self.notify = notify
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue))
+        self._stats_lock = threading.Lock()
+        self.images_written = 0
+        self.image_errors = 0
+        self.records_written = 0
+        self.record_errors = 0
+        self.batches = 0
+        self.dropped_images = 0
+        self.dropped_records = 0
+        self.blocked_seconds = 0.0
+        self.high_watermark = 0
+        self._thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+        self._thread.start()
+
+    def save_image(self, path: str, image: np.ndarray) -> bool:
+        """Queue ``image`` to be written to ``path``. Returns False if it was dropped."""
+        try:
+            self._queue.put_nowait(("image", path, image))
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped_images += 1
+            return False
+        self._track_depth()
+        return True
+
+    def log(self, record: Dict) -> bool:
+        """Queue a log record for notification and batched insertion. Returns False if it was dropped."""
+        return self._put_records("record", [record])
+
+    def log_many(self, records: List[Dict]) -> bool:
+        """Queue records that are flushed together, without waiting for ``flush_interval``. Returns False if they were dropped."""
+        return self._put_records("batch", records)
+
+    def _put_records(self, kind: str, records: List[Dict]) -> bool:
+        start = time.monotonic()
+        try:
+            self._queue.put((kind, records, None), timeout=self.put_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped_records += len(records)
+                self.blocked_seconds += time.monotonic() - start
+            print(f"Persistence queue full, dropped {len(records)} log records")
+            return False
+        waited = time.monotonic() - start
+        with self._stats_lock:
+            self.blocked_seconds += waited
+        self._track_depth()
+        return True
+
+    def _track_depth(self) -> None:
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            if depth > self.high_watermark:
+                self.high_watermark = depth
+
+    def _write_image(self, path: str, image: np.ndarray) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not cv2.imwrite(path, image):
+                raise IOError(f"cv2.imwrite returned False for {path}")
+        except Exception as e:
+            print(f"Error: Failed to save image {path}: {e}")
+            with self._stats_lock:
+                self.image_errors += 1
+            return
+        with self._stats_lock:
+            self.images_written += 1
+
+    def _flush(self, records: List[Dict]) -> None:
+        if not records:
+            return
+        if self.notify is not None:
+            for record in records:
+                try:
+                    self.notify(record)
+                except Exception:
+                    logging.exception("Failed to notify new face")
+        try:
+            self.collection.insert_many(records, ordered=False)
+        except Exception as e:
+            print(f"Error: Failed to insert {len(records)} log records: {e}")
+            with self._stats_lock:
+                self.record_errors += len(records)
+            return
+        with self._stats_lock:
+            self.records_written += len(records)
+            self.batches += 1
+
+    def _run(self) -> None:
+        pending: List[Dict] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(pending)
+                return
+            if item is not None:
+                kind, payload, image = item
+                if kind == "image":
+                    self._write_image(payload, image)
+                else:
+                    pending.extend(payload)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    if kind == "batch":
+                        deadline = time.monotonic()
+            if pending and (len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(pending)
+                pending = []
+                deadline = None
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write everything still queued, then end the worker thread."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "high_watermark": self.high_watermark,
+                "images_written": self.images_written,
+                "image_errors": self.image_errors,
+                "records_written": self.records_written,
+                "record_errors": self.record_errors,
+                "batches": self.batches,
+                "avg_batch_size": round(self.records_written / self.batches, 2) if self.batches else 0.0,
+                "dropped_images": self.dropped_images,
+                "dropped_records": self.dropped_records,
+                "blocked_seconds": round(self.blocked_seconds, 3),
+            }
@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+__all__ = [
+    "PersonnelCache",
+]
+
+_MISSING = object()
+
+
+class PersonnelCache:
+    """
+    In-process LRU + TTL cache of personnel records from the utils service.
+
+    ``get`` never touches the network: a miss or an expired entry schedules a background
+    fetch (at most one in flight per id) and returns the stale record, or None until the
+    first fetch lands. Ids the service does not know, or that failed to load, are cached
+    as missing for ``negative_ttl`` seconds so a stranger-heavy camera does not hammer the
+    service. ``invalidate`` / ``put`` are for the update path.
+    """
+
+    def __init__(self, base_url: str = "http://utils_service:5004/personel", max_size: int = 1024, ttl: float = 300.0,
+                 negative_ttl: float = 30.0, workers: int = 2, timeout: float = 5.0) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.trust_env = False  # same as proxies={"http": None, "https": None}
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="personnel-cache")
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    def get(self, personnel_id: str) -> Optional[Dict]:
+        """Cached record of ``personnel_id`` or None; refreshes in the background when needed."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(personnel_id)
+            if entry is None:
+                self.misses += 1
+                self._schedule(personnel_id)
+                return None
+            value, expires_at = entry
+            self._entries.move_to_end(personnel_id)
+            if now >= expires_at:
+                self._schedule(personnel_id)
+                self.stale_hits += 1
+            elif value is _MISSING:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return None if value is _MISSING else value
+
+    def put(self, personnel_id: str, person: Optional[Dict]) -> None:
+        valid = bool(person) and "name" in person and "lastname" in person
+        with self._lock:
+            self._store(personnel_id, person if valid else _MISSING)
+
+    def prime(self, records: Iterable[Dict]) -> None:
+        """Fill the cache from a roster listing (records with an ``_id``)."""
+        for record in records:
+            if record.get("_id"):
+                self.put(str(record["_id"]), record)
+
+    def invalidate(self, personnel_id: str) -> None:
+        with self._lock:
+            self._entries.pop(personnel_id, None)
+
+    def _store(self, personnel_id: str, value) -> None:
+        ttl = self.negative_ttl if value is _MISSING else self.ttl
+        self._entries[personnel_id] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(personnel_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _schedule(self, personnel_id: str) -> None:
+        # Caller holds the lock
+        if personnel_id in self._in_flight:
+            return
+        self._in_flight.add(personnel_id)
+        self._executor.submit(self._fetch, personnel_id)
+
+    def _fetch(self, personnel_id: str) -> None:
+        person = None
+        failed = False
+        try:
+            response = self.session.get(f"{self.base_url}/{personnel_id}", timeout=self.timeout)
+            if response.status_code != 404:
+                response.raise_for_status()
+                person = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"An error occurred while fetching personnel details: {e}")
+            failed = True
+        except Exception:
+            logging.exception(f"Unexpected error fetching personnel {personnel_id}")
+            failed = True
+        with self._lock:
+            self.fetches += 1
+            self.fetch_errors += failed
+            self._in_flight.discard(personnel_id)
+            entry = self._entries.get(personnel_id)
+            if failed and entry is not None and entry[0] is not _MISSING:
+                # Keep serving the stale record and retry after negative_ttl
+                self._entries[personnel_id] = (entry[0], time.monotonic() + self.negative_ttl)
+                return
+        self.put(personnel_id, person)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "fetches": self.fetches,
+                "fetch_errors": self.fetch_errors,
+            }
@@ -0,0 +1,89 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+__all__ = [
+    "CameraRegions",
+    "parse_polygon",
+]
+
+
+def parse_polygon(points) -> np.ndarray:
+    """
+    Validate one polygon given as ``[[x, y], ...]`` in normalized (0-1) frame coordinates.
+
+    Raises ``ValueError`` on anything that is not at least three numeric points inside the frame.
+    """
+    try:
+        polygon = np.asarray(points, dtype=np.float32)
+    except (TypeError, ValueError):
+        raise ValueError("Polygon points must be numbers")
+    if polygon.ndim != 2 or polygon.shape[1] != 2 or len(polygon) < 3:
+        raise ValueError("A polygon needs at least three [x, y] points")
+    if not np.all(np.isfinite(polygon)) or polygon.min() < 0 or polygon.max() > 1:
+        raise ValueError("Polygon coordinates must be normalized to the 0-1 range")
+    return polygon
+
+
+class CameraRegions:
+    """
+    Region of interest and exclusion zones of one camera.
+
+    Polygons are stored normalized so they survive stream quality (resolution) changes.
+    The detector only sees the bounding rectangle of the ROI; detections whose center
+    falls outside the ROI polygon or inside an exclusion polygon are dropped.
+    """
+
+    def __init__(self, roi: Optional[Sequence] = None, exclusions: Optional[List[Sequence]] = None) -> None:
+        self.roi = parse_polygon(roi) if roi is not None and len(roi) else None
+        self.exclusions = [parse_polygon(polygon) for polygon in (exclusions or [])]
+        self._masks: Dict[Tuple[int, int], Tuple[Tuple[int, int, int, int], np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_document(cls, camera: Optional[Dict]) -> Optional["CameraRegions"]:
+        """Build from a ``cameras`` collection document; ``None`` when it defines no regions."""
+        if not camera or not (camera.get("roi") or camera.get("exclusions")):
+            return None
+        return cls(camera.get("roi"), camera.get("exclusions"))
+
+    @property
+    def is_empty(self) -> bool:
+        return self.roi is None and not self.exclusions
+
+    def _prepare(self, height: int, width: int) -> Tuple[Tuple[int, int, int, int], np.ndarray]:
+        with self._lock:
+            cached = self._masks.get((height, width))
+            if cached is not None:
+                return cached
+            scale = np.array([width, height], dtype=np.float32)
+            if self.roi is None:
+                rect = (0, 0, width, height)
+                mask = np.full((height, width), 255, dtype=np.uint8)
+            else:
+                roi = np.round(self.roi * scale).astype(np.int32)
+                x, y, w, h = cv2.boundingRect(roi)
+                rect = (x, y, min(x + w, width), min(y + h, height))
+                mask = np.zeros((height, width), dtype=np.uint8)
+                cv2.fillPoly(mask, [roi], 255)
+            for polygon in self.exclusions:
+                cv2.fillPoly(mask, [np.round(polygon * scale).astype(np.int32)], 0)
+            self._masks[(height, width)] = rect, mask
+            return rect, mask
+
+    def crop_rect(self, frame_shape) -> Tuple[int, int, int, int]:
+        """``x1, y1, x2, y2`` pixel rectangle the detector has to look at."""
+        return self._prepare(*frame_shape[:2])[0]
+
+    def filter(self, bboxes: np.ndarray, kpss: Optional[np.ndarray], frame_shape) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Drop detections (in full-frame coordinates) whose box center is outside the allowed area."""
+        if len(bboxes) == 0:
+            return bboxes, kpss
+        height, width = frame_shape[:2]
+        _, mask = self._prepare(height, width)
+        cx = np.clip(((bboxes[:, 0] + bboxes[:, 2]) / 2).astype(int), 0, width - 1)
+        cy = np.clip(((bboxes[:, 1] + bboxes[:, 3]) / 2).astype(int), 0, height - 1)
+        keep = mask[cy, cx] > 0
+        return bboxes[keep], (kpss[keep] if kpss is not None else None)
@@ -6,6 +6,8 @@ import os
 import os.path as osp
 import cv2
 import sys
+import threading
+import time
 import traceback
 
 def softmax(z):
@@ -43,27 +45,106 @@ def distance2bbox(points, distance, max_shape=None):
 
 
 def distance2kps(points, distance, max_shape=None):
-    """Decode distance prediction to bounding box.
+    """Decode distance prediction to keypoints.
 
     Args:
-        points (Tensor): Shape (n, 2), [x, y].
-        distance (Tensor): Distance from the given point to 4
-            boundaries (left, top, right, bottom).
+        points (ndarray): Shape (n, 2), [x, y].
+        distance (ndarray): Shape (n, 2k), offsets of the k keypoints from each point.
         max_shape (tuple): Shape of the image.
 
     Returns:
-        Tensor: Decoded bboxes.
+        ndarray: Decoded keypoints, shape (n, 2k).
     """
-    preds = []
-    for i in range(0, distance.shape[1], 2):
-        px = points[:, i % 2] + distance[:, i]
-        py = points[:, i % 2 + 1] + distance[:, i + 1]
-        if max_shape is not None:
-            px = px.clamp(min=0, max=max_shape[1])
-            py = py.clamp(min=0, max=max_shape[0])
-        preds.append(px)
-        preds.append(py)
-    return np.stack(preds, axis=-1)
+    preds = distance.reshape(distance.shape[0], -1, 2) + points[:, None, :2]
+    if max_shape is not None:
+        preds[..., 0] = np.clip(preds[..., 0], 0, max_shape[1])
+        preds[..., 1] = np.clip(preds[..., 1], 0, max_shape[0])
+    return preds.reshape(distance.shape[0], -1)
+
+
+class MultiScalePolicy:
+    """
+    Decides when ``SCRFD.autodetect`` needs its second, small-input pass.
+
+    The secondary (128x128) pass only exists to catch faces too large for the primary
+    (640x640) anchors. In ``adaptive`` mode it runs when the primary pass found nothing,
+    when its best face scored below ``low_confidence``, or when a close-up face (height at
+    least ``close_up_ratio`` of the frame) was seen on the same stream within the last
+    ``close_up_frames`` frames. ``close_up`` mode keeps only that last trigger, so frames
+    without a recent close-up cost a single primary pass. ``always`` and ``never`` force
+    the choice.
+    """
+
+    MODES = ("adaptive", "close_up", "always", "never")
+
+    def __init__(self, mode="adaptive", primary_size=(640, 640), secondary_size=(128, 128), thresh=0.8,
+                 low_confidence=0.9, close_up_ratio=0.35, close_up_frames=30):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown multi-scale mode: {mode}")
+        self.mode = mode
+        self.primary_size = tuple(primary_size)
+        self.secondary_size = tuple(secondary_size)
+        self.thresh = thresh
+        self.low_confidence = low_confidence
+        self.close_up_ratio = close_up_ratio
+        self.close_up_frames = close_up_frames
+        self._frames_since_close_up = {}
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.secondary_runs = 0
+        self.secondary_hits = 0
+        self.reasons = {"no_face": 0, "low_confidence": 0, "close_up": 0, "always": 0}
+
+    def should_run_secondary(self, img, bboxes, stream=None):
+        """Return ``(run, reason)`` for a frame whose primary pass produced ``bboxes``."""
+        with self._lock:
+            self.frames += 1
+            if self.mode == "never":
+                return False, None
+            if self.mode == "always":
+                return True, "always"
+            if self.mode == "close_up":
+                if stream is not None and self._frames_since_close_up.get(stream, self.close_up_frames) < self.close_up_frames:
+                    return True, "close_up"
+                return False, None
+            if len(bboxes) == 0:
+                return True, "no_face"
+            if float(np.max(bboxes[:, 4])) < self.low_confidence:
+                return True, "low_confidence"
+            if stream is not None and self._frames_since_close_up.get(stream, self.close_up_frames) < self.close_up_frames:
+                return True, "close_up"
+            return False, None
+
+    def record_secondary(self, reason, new_faces):
+        """Count one secondary pass and whether it contributed faces the primary missed."""
+        with self._lock:
+            self.secondary_runs += 1
+            self.reasons[reason] += 1
+            if new_faces > 0:
+                self.secondary_hits += 1
+
+    def observe(self, img, bboxes, stream=None):
+        """Update the close-up history of ``stream`` with this frame's final detections."""
+        if stream is None:
+            return
+        heights = bboxes[:, 3] - bboxes[:, 1] if len(bboxes) else np.zeros(0)
+        with self._lock:
+            if len(heights) and float(np.max(heights)) >= self.close_up_ratio * img.shape[0]:
+                self._frames_since_close_up[stream] = 0
+            elif stream in self._frames_since_close_up:
+                self._frames_since_close_up[stream] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "frames": self.frames,
+                "secondary_runs": self.secondary_runs,
+                "secondary_hits": self.secondary_hits,
+                "run_rate": round(self.secondary_runs / self.frames, 3) if self.frames else 0.0,
+                "hit_rate": round(self.secondary_hits / self.secondary_runs, 3) if self.secondary_runs else 0.0,
+                "reasons": dict(self.reasons),
+            }
 
 
 class SCRFD:
@@ -80,8 +161,11 @@ class SCRFD:
                 self.model_file, providers=["CUDAExecutionProvider"]
             )
         self.center_cache = {}
+        # Per-thread letterbox canvases, reused across calls
+        self._buffers = threading.local()
         self.nms_thresh = 0.4
         self.det_thresh = 0.5
+        self.multiscale = MultiScalePolicy()
         self._init_vars()
 
     def _init_vars(self):
@@ -146,9 +230,6 @@ class SCRFD:
                 self.input_size = input_size
 
     def forward(self, img, threshold):
-        scores_list = []
-        bboxes_list = []
-        kpss_list = []
         input_size = tuple(img.shape[0:2][::-1])
         blob = cv2.dnn.blobFromImage(
             img,
@@ -158,25 +239,26 @@ class SCRFD:
             swapRB=True,
         )
         net_outs = self.session.run(self.output_names, {self.input_name: blob})
+        return self._decode(net_outs, 0, blob.shape[2], blob.shape[3], threshold)
 
-        input_height = blob.shape[2]
-        input_width = blob.shape[3]
+    def _decode(self, net_outs, batch_index, input_height, input_width, threshold):
+        scores_list = []
+        bboxes_list = []
+        kpss_list = []
         fmc = self.fmc
         for idx, stride in enumerate(self._feat_stride_fpn):
-            # If model support batch dim, take first output
+            # If model support batch dim, take the output of this image
             if self.batched:
-                scores = net_outs[idx][0]
-                bbox_preds = net_outs[idx + fmc][0]
-                bbox_preds = bbox_preds * stride
+                scores = net_outs[idx][batch_index]
+                bbox_preds = net_outs[idx + fmc][batch_index]
                 if self.use_kps:
-                    kps_preds = net_outs[idx + fmc * 2][0] * stride
+                    kps_preds = net_outs[idx + fmc * 2][batch_index]
             # If model doesn't support batching take output as is
             else:
                 scores = net_outs[idx]
                 bbox_preds = net_outs[idx + fmc]
-                bbox_preds = bbox_preds * stride
                 if self.use_kps:
-                    kps_preds = net_outs[idx + fmc * 2] * stride
+                    kps_preds = net_outs[idx + fmc * 2]
 
             height = input_height // stride
             width = input_width // stride
@@ -212,79 +294,93 @@ class SCRFD:
                 if len(self.center_cache) < 100:
                     self.center_cache[key] = anchor_centers
 
-            pos_inds = np.where(scores >= threshold)[0]
-            bboxes = distance2bbox(anchor_centers, bbox_preds)
-            pos_scores = scores[pos_inds]
-            pos_bboxes = bboxes[pos_inds]
-            scores_list.append(pos_scores)
-            bboxes_list.append(pos_bboxes)
+            # Filter by score first and only decode the surviving anchors
+            pos_inds = np.flatnonzero(scores.reshape(-1) >= threshold)
+            pos_centers = anchor_centers[pos_inds]
+            scores_list.append(scores.reshape(-1, 1)[pos_inds])
+            bboxes_list.append(distance2bbox(pos_centers, bbox_preds[pos_inds] * stride))
             if self.use_kps:
-                kpss = distance2kps(anchor_centers, kps_preds)
-                # kpss = kps_preds
-                kpss = kpss.reshape((kpss.shape[0], -1, 2))
-                pos_kpss = kpss[pos_inds]
-                kpss_list.append(pos_kpss)
+                kpss = distance2kps(pos_centers, kps_preds[pos_inds] * stride)
+                kpss_list.append(kpss.reshape((kpss.shape[0], -1, 2)))
         return scores_list, bboxes_list, kpss_list
 
+    def _letterbox(self, img, input_size, slot=0):
+        im_ratio = float(img.shape[0]) / img.shape[1]
+        model_ratio = float(input_size[1]) / input_size[0]
+        if im_ratio > model_ratio:
+            new_height = input_size[1]
+            new_width = int(new_height / im_ratio)
+        else:
+            new_width = input_size[0]
+            new_height = int(new_width * im_ratio)
+
+        det_scale = float(new_height) / img.shape[0]
+        # Reuse this thread's canvas for the input size; only the padding needs clearing
+        det_img = self._canvas(input_size, slot)
+        det_img[:new_height, :new_width, :] = cv2.resize(img, (new_width, new_height))
+        det_img[new_height:, :, :] = 0
+        det_img[:new_height, new_width:, :] = 0
+        return det_img, det_scale
+
+    def _canvas(self, input_size, slot=0):
+        canvases = getattr(self._buffers, "canvases", None)
+        if canvases is None:
+            canvases = self._buffers.canvases = {}
+        key = (input_size[0], input_size[1], slot)
+        canvas = canvases.get(key)
+        if canvas is None:
+            canvas = canvases[key] = np.zeros((input_size[1], input_size[0], 3), dtype=np.uint8)
+        return canvas
+
+    def _postprocess(self, img, scores_list, bboxes_list, kpss_list, det_scale, max_num, metric):
+        scores = np.vstack(scores_list)
+        scores_ravel = scores.ravel()
+        order = scores_ravel.argsort()[::-1]
+        bboxes = np.vstack(bboxes_list) / det_scale
+        if self.use_kps:
+            kpss = np.vstack(kpss_list) / det_scale
+        pre_det = np.hstack((bboxes, scores)).astype(np.float32, copy=False)
+        pre_det = pre_det[order, :]
+        keep = self.nms(pre_det)
+        det = pre_det[keep, :]
+        if self.use_kps:
+            kpss = kpss[order, :, :]
+            kpss = kpss[keep, :, :]
+        else:
+            kpss = None
+        if max_num > 0 and det.shape[0] > max_num:
+            area = (det[:, 2] - det[:, 0]) * (det[:, 3] - det[:, 1])
+            img_center = img.shape[0] // 2, img.shape[1] // 2
+            offsets = np.vstack(
+                [
+                    (det[:, 0] + det[:, 2]) / 2 - img_center[1],
+                    (det[:, 1] + det[:, 3]) / 2 - img_center[0],
+                ]
+            )
+            offset_dist_squared = np.sum(np.power(offsets, 2.0), 0)
+            if metric == "max":
+                values = area
+            else:
+                values = (
+                    area - offset_dist_squared * 2.0
+                )  # some extra weight on the centering
+            bindex = np.argsort(values)[::-1]  # some extra weight on the cientering
+            bindex = bindex[0:max_num]
+            det = np.array(det[bindex, :])
+            if kpss is not None:
+                kpss = np.array(kpss[bindex, :])
+        return det, kpss
+
     def detect(self, img, input_size=None, thresh=None, max_num=0, metric="default"):
         try:
             assert input_size is not None or self.input_size is not None
             input_size = self.input_size if input_size is None else input_size
 
-            im_ratio = float(img.shape[0]) / img.shape[1]
-            model_ratio = float(input_size[1]) / input_size[0]
-            if im_ratio > model_ratio:
-                new_height = input_size[1]
-                new_width = int(new_height / im_ratio)
-            else:
-                new_width = input_size[0]
-                new_height = int(new_width * im_ratio)
-
-            det_scale = float(new_height) / img.shape[0]
-            resized_img = cv2.resize(img, (new_width, new_height))
-            det_img = np.zeros((input_size[1], input_size[0], 3), dtype=np.uint8)
-            det_img[:new_height, :new_width, :] = resized_img
+            det_img, det_scale = self._letterbox(img, input_size)
             det_thresh = thresh if thresh is not None else self.det_thresh
 
             scores_list, bboxes_list, kpss_list = self.forward(det_img, det_thresh)
-
-            scores = np.vstack(scores_list)
-            scores_ravel = scores.ravel()
-            order = scores_ravel.argsort()[::-1]
-            bboxes = np.vstack(bboxes_list) / det_scale
-            if self.use_kps:
-                kpss = np.vstack(kpss_list) / det_scale
-            pre_det = np.hstack((bboxes, scores)).astype(np.float32, copy=False)
-            pre_det = pre_det[order, :]
-            keep = self.nms(pre_det)
-            det = pre_det[keep, :]
-            if self.use_kps:
-                kpss = kpss[order, :, :]
-                kpss = kpss[keep, :, :]
-            else:
-                kpss = None
-            if max_num > 0 and det.shape[0] > max_num:
-                area = (det[:, 2] - det[:, 0]) * (det[:, 3] - det[:, 1])
-                img_center = img.shape[0] // 2, img.shape[1] // 2
-                offsets = np.vstack(
-                    [
-                        (det[:, 0] + det[:, 2]) / 2 - img_center[1],
-                        (det[:, 1] + det[:, 3]) / 2 - img_center[0],
-                    ]
-                )
-                offset_dist_squared = np.sum(np.power(offsets, 2.0), 0)
-                if metric == "max":
-                    values = area
-                else:
-                    values = (
-                        area - offset_dist_squared * 2.0
-                    )  # some extra weight on the centering
-                bindex = np.argsort(values)[::-1]  # some extra weight on the cientering
-                bindex = bindex[0:max_num]
-                det = np.array(det[bindex, :])
-                if kpss is not None:
-                    kpss = np.array(kpss[bindex, :])
-            return det, kpss
+            return self._postprocess(img, scores_list, bboxes_list, kpss_list, det_scale, max_num, metric)
         except ZeroDivisionError:
             print("Error: Division by zero encountered in the image height or width calculation.")
             return [], None
@@ -305,6 +401,40 @@ class SCRFD:
             traceback.print_exc()
             return [], None
 
+    def detect_batch(self, frames, input_size=None, thresh=None, max_num=0, metric="default"):
+        """
+        Detect faces in several frames with one session call.
+
+        All frames are letterboxed into one NCHW blob and the per-image outputs are decoded
+        separately. Returns a list of ``(bboxes, kpss)``, one per frame, exactly like
+        ``detect``. Models exported without a dynamic batch axis fall back to ``detect``
+        per frame.
+        """
+        if len(frames) == 0:
+            return []
+        input_size = self.input_size if input_size is None else input_size
+        if len(frames) == 1 or not self.batched or isinstance(self.input_shape[0], int) or input_size is None:
+            return [self.detect(img, input_size, thresh, max_num, metric) for img in frames]
+        try:
+            det_thresh = thresh if thresh is not None else self.det_thresh
+            letterboxed = [self._letterbox(img, input_size, slot) for slot, img in enumerate(frames)]
+            blob = cv2.dnn.blobFromImages(
+                [det_img for det_img, _ in letterboxed],
+                1.0 / self.input_std,
+                tuple(input_size),
+                (self.input_mean, self.input_mean, self.input_mean),
+                swapRB=True,
+            )
+            net_outs = self.session.run(self.output_names, {self.input_name: blob})
+            results = []
+            for b, (img, (_, det_scale)) in enumerate(zip(frames, letterboxed)):
+                scores_list, bboxes_list, kpss_list = self._decode(net_outs, b, blob.shape[2], blob.shape[3], det_thresh)
+                results.append(self._postprocess(img, scores_list, bboxes_list, kpss_list, det_scale, max_num, metric))
+            return results
+        except Exception as e:
+            print(f"Batched detection failed, detecting frame by frame: {e}")
+            return [self.detect(img, input_size, thresh, max_num, metric) for img in frames]
+
     # def detect(self, img, input_size=None, thresh=None, max_num=0, metric="default"):
     #     assert input_size is not None or self.input_size is not None
     #     input_size = self.input_size if input_size is None else input_size
@@ -363,15 +493,57 @@ class SCRFD:
     #             kpss = kpss[bindex, :]
     #     return det, kpss
 
-    def autodetect(self, img, max_num=0, metric="max"):
-
-        bboxes, kpss = self.detect(img, input_size=(640, 640), thresh=0.8)
-        bboxes2, kpss2 = self.detect(img, input_size=(128, 128), thresh=0.8)
+    def autodetect(self, img, max_num=0, metric="max", stream=None):
+        """
+        Detect at the primary input size and, when ``self.multiscale`` asks for it, again at
+        the secondary size, merging both passes with NMS. ``stream`` keys the close-up
+        history, so pass the camera name for video and leave it ``None`` for still images.
+        """
+        policy = self.multiscale
+        bboxes, kpss = self._detect_or_empty(img, policy.primary_size, policy.thresh)
+        run_secondary, reason = policy.should_run_secondary(img, bboxes, stream)
+        if run_secondary:
+            bboxes2, kpss2 = self._detect_or_empty(img, policy.secondary_size, policy.thresh)
+            bboxes, kpss = self._merge_passes(bboxes, kpss, bboxes2, kpss2, reason)
+        policy.observe(img, bboxes, stream)
+        return self._select(img, bboxes, kpss, max_num, metric)
+
+    def autodetect_batch(self, frames, max_num=0, metric="max", streams=None):
+        """
+        ``autodetect`` for several frames: one batched primary pass, then one batched
+        secondary pass over only the frames the policy picks. ``streams[i]`` keys the
+        close-up history of frame ``i`` (the camera name); it is updated after the whole
+        batch has been decided, so consecutive frames of one stream see the same history.
+        """
+        policy = self.multiscale
+        streams = streams if streams is not None else [None] * len(frames)
+        primary = [self._or_empty(*result) for result in self.detect_batch(frames, policy.primary_size, policy.thresh)]
+        decisions = [
+            policy.should_run_secondary(img, bboxes, stream)
+            for img, (bboxes, _), stream in zip(frames, primary, streams)
+        ]
+        rerun = [i for i, (run_secondary, _) in enumerate(decisions) if run_secondary]
+        secondary = {}
+        if rerun:
+            secondary = dict(zip(rerun, self.detect_batch([frames[i] for i in rerun], policy.secondary_size, policy.thresh)))
+        results = []
+        for i, (img, stream) in enumerate(zip(frames, streams)):
+            bboxes, kpss = primary[i]
+            if i in secondary:
+                bboxes, kpss = self._merge_passes(bboxes, kpss, *self._or_empty(*secondary[i]), decisions[i][1])
+            policy.observe(img, bboxes, stream)
+            results.append(self._select(img, bboxes, kpss, max_num, metric))
+        return results
+
+    def _merge_passes(self, bboxes, kpss, bboxes2, kpss2, reason):
         bboxes_all = np.concatenate([bboxes, bboxes2], axis=0)
         kpss_all = np.concatenate([kpss, kpss2], axis=0)
         keep = self.nms(bboxes_all)
-        det = bboxes_all[keep, :]
-        kpss = kpss_all[keep, :]
+        self.multiscale.record_secondary(reason, int(np.sum(np.asarray(keep) >= len(bboxes))))
+        return bboxes_all[keep, :], kpss_all[keep, :]
+
+    @staticmethod
+    def _select(img, det, kpss, max_num, metric):
         if max_num > 0 and det.shape[0] > max_num:
             area = (det[:, 2] - det[:, 0]) * (det[:, 3] - det[:, 1])
             img_center = img.shape[0] // 2, img.shape[1] // 2
@@ -395,36 +567,24 @@ class SCRFD:
                 kpss = kpss[bindex, :]
         return det, kpss
 
-    def nms(self, dets):
-        thresh = self.nms_thresh
-        x1 = dets[:, 0]
-        y1 = dets[:, 1]
-        x2 = dets[:, 2]
-        y2 = dets[:, 3]
-        scores = dets[:, 4]
-
-        areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-        order = scores.argsort()[::-1]
-
-        keep = []
-        while order.size > 0:
-            i = order[0]
-            keep.append(i)
-            xx1 = np.maximum(x1[i], x1[order[1:]])
-            yy1 = np.maximum(y1[i], y1[order[1:]])
-            xx2 = np.minimum(x2[i], x2[order[1:]])
-            yy2 = np.minimum(y2[i], y2[order[1:]])
-
-            w = np.maximum(0.0, xx2 - xx1 + 1)
-            h = np.maximum(0.0, yy2 - yy1 + 1)
-            inter = w * h
-            ovr = inter / (areas[i] + areas[order[1:]] - inter)
+    @staticmethod
+    def _or_empty(bboxes, kpss):
+        if len(bboxes) == 0:
+            return np.zeros((0, 5), dtype=np.float32), np.zeros((0, 5, 2), dtype=np.float32)
+        return bboxes, kpss
 
-            inds = np.where(ovr <= thresh)[0]
-            order = order[inds + 1]
-
-        return keep
+    def _detect_or_empty(self, img, input_size, thresh):
+        return self._or_empty(*self.detect(img, input_size=input_size, thresh=thresh))
 
+    def nms(self, dets):
+        if len(dets) == 0:
+            return []
+        # OpenCV's NMS; widths/heights get the +1 of the original implementation's IoU
+        boxes = np.empty((len(dets), 4), dtype=np.float64)
+        boxes[:, :2] = dets[:, :2]
+        boxes[:, 2:] = dets[:, 2:4] - dets[:, :2] + 1
+        keep = cv2.dnn.NMSBoxes(boxes.tolist(), dets[:, 4].tolist(), 0.0, self.nms_thresh)
+        return np.asarray(keep, dtype=np.int64).reshape(-1)
 
 
 def test():
@@ -469,5 +629,59 @@ def test():
     if kpss is not None:
         print("Keypoints:", kpss)
 
+
+
+def benchmark(model_file, image_path=None, input_size=(640, 640), thresh=0.5, repeats=200):
+    """
+    Per-frame CPU cost of everything around ``session.run``: letterbox, decode and NMS.
+
+    The network runs once; its outputs are then post-processed ``repeats`` times so the
+    numbers isolate the Python/numpy side of detection.
+    """
+    model = SCRFD(model_file=model_file)
+    model.prepare(-1)
+    img = cv2.imread(image_path) if image_path else None
+    if img is None:
+        img = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+
+    det_img, det_scale = model._letterbox(img, input_size)
+    blob = cv2.dnn.blobFromImage(
+        det_img, 1.0 / model.input_std, input_size, (model.input_mean,) * 3, swapRB=True
+    )
+    net_outs = model.session.run(model.output_names, {model.input_name: blob})
+
+    timings = {"letterbox": 0.0, "decode": 0.0, "postprocess": 0.0}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model._letterbox(img, input_size)
+        letterboxed = time.perf_counter()
+        scores_list, bboxes_list, kpss_list = model._decode(net_outs, 0, blob.shape[2], blob.shape[3], thresh)
+        decoded = time.perf_counter()
+        det, _ = model._postprocess(img, scores_list, bboxes_list, kpss_list, det_scale, 0, "default")
+        end = time.perf_counter()
+        timings["letterbox"] += letterboxed - start
+        timings["decode"] += decoded - letterboxed
+        timings["postprocess"] += end - decoded
+    candidates = sum(len(s) for s in scores_list)
+    print(f"{candidates} candidates above {thresh}, {len(det)} after NMS")
+    for stage, seconds in timings.items():
+        print(f"{stage:<12} {seconds * 1000 / repeats:8.3f} ms/frame")
+    print(f"{'total':<12} {sum(timings.values()) * 1000 / repeats:8.3f} ms/frame")
+    return timings
+
+
 if __name__ == "__main__":
-    test()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SCRFD smoke test and post-processing benchmark")
+    parser.add_argument("command", nargs="?", choices=["test", "benchmark"], default="test")
+    parser.add_argument("--model", type=str, default=os.path.expanduser("~/.insightface/models/buffalo_l/det_10g.onnx"))
+    parser.add_argument("--image", type=str, default=None)
+    parser.add_argument("--size", type=int, default=640)
+    parser.add_argument("--thresh", type=float, default=0.5)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    if args.command == "benchmark":
+        benchmark(args.model, args.image, (args.size, args.size), args.thresh, args.repeats)
+    else:
+        test()
\ No newline at end of file
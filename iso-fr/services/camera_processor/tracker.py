@@ -0,0 +1,177 @@
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+__all__ = [
+    "FaceTrack",
+    "FaceTracker",
+    "iou_matrix",
+]
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (N, 4) and (M, 4) ``x1, y1, x2, y2`` boxes."""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class _KalmanBox:
+    """Constant-velocity Kalman filter over the box center and size ``(cx, cy, w, h)``."""
+
+    _F = np.eye(8, dtype=np.float32)
+    _F[:4, 4:] = np.eye(4, dtype=np.float32)
+    _H = np.eye(4, 8, dtype=np.float32)
+    _Q = np.diag([1, 1, 1, 1, 0.01, 0.01, 0.0001, 0.0001]).astype(np.float32)
+    _R = np.diag([1, 1, 10, 10]).astype(np.float32)
+
+    def __init__(self, box: np.ndarray) -> None:
+        self.x = np.zeros(8, dtype=np.float32)
+        self.x[:4] = self._to_z(box)
+        self.P = np.diag([10, 10, 10, 10, 1000, 1000, 1000, 1000]).astype(np.float32)
+
+    @staticmethod
+    def _to_z(box: np.ndarray) -> np.ndarray:
+        x1, y1, x2, y2 = box[:4]
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float32)
+
+    def box(self) -> np.ndarray:
+        cx, cy, w, h = self.x[:4]
+        w, h = max(w, 1.0), max(h, 1.0)
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float32)
+
+    def predict(self) -> np.ndarray:
+        # Do not let a shrinking box collapse through zero size
+        if self.x[2] + self.x[6] <= 0:
+            self.x[6] = 0
+        if self.x[3] + self.x[7] <= 0:
+            self.x[7] = 0
+        self.x = self._F @ self.x
+        self.P = self._F @ self.P @ self._F.T + self._Q
+        return self.box()
+
+    def update(self, box: np.ndarray) -> None:
+        y = self._to_z(box) - self._H @ self.x
+        S = self._H @ self.P @ self._H.T + self._R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8, dtype=np.float32) - K @ self._H) @ self.P
+
+
+class FaceTrack:
+    """One face followed across frames, with the results of the expensive stages cached."""
+
+    def __init__(self, track_id: int, box: np.ndarray) -> None:
+        self.track_id = track_id
+        self.kalman = _KalmanBox(box)
+        self.bbox = np.asarray(box[:4], dtype=np.float32)
+        self.hits = 1
+        self.time_since_update = 0
+        self.frames_since_refresh = 0
+        self.refreshed = False
+        # Cached per-track state, filled in by the recognition pipeline
+        self.personnel_id: Optional[str] = None
+        self.label: str = "Unknown"
+        self.similarity: float = 0.0
+        self.embedding: Optional[np.ndarray] = None
+        self.gender: Optional[int] = None
+        self.age: Optional[int] = None
+        self.live: bool = True
+        # Unknown-visitor cluster of an unmatched face, and whether its visit still has to be logged
+        self.visitor_id: Optional[str] = None
+        self.log_visit: bool = False
+
+    @property
+    def is_known(self) -> bool:
+        return self.personnel_id is not None
+
+
+class FaceTracker:
+    """
+    IoU + Kalman tracker (SORT-style) that gives SCRFD detections persistent track ids.
+
+    Each frame the tracks are propagated with their Kalman filters, then greedily matched
+    to the new detections by IoU. Unmatched detections start new tracks; tracks unmatched
+    for more than ``max_age`` frames are dropped.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: int = 15, refresh_interval: int = 10, low_confidence_margin: float = 0.1) -> None:
+        self.iou_threshold = iou_threshold
+        self.low_confidence_margin = low_confidence_margin
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.tracks: Dict[int, FaceTrack] = {}
+        self._ids = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def update(self, bboxes: np.ndarray) -> Tuple[List[FaceTrack], List[int]]:
+        """
+        Associate this frame's detections with tracks.
+
+        :param bboxes: (N, 4+) detections in ``x1, y1, x2, y2`` order.
+        :return: ``(tracks, removed_ids)`` where ``tracks[i]`` belongs to detection ``i``.
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float32)
+        if bboxes.size == 0:
+            bboxes = np.zeros((0, 4), dtype=np.float32)
+        track_ids = list(self.tracks)
+        predicted = np.array([self.tracks[t].kalman.predict() for t in track_ids], dtype=np.float32).reshape(-1, 4)
+
+        assigned: List[Optional[FaceTrack]] = [None] * len(bboxes)
+        matched = set()
+        if len(track_ids) and len(bboxes):
+            ious = iou_matrix(bboxes[:, :4], predicted)
+            # Greedy assignment, best overlaps first
+            for flat in np.argsort(-ious, axis=None):
+                det, trk = divmod(int(flat), len(track_ids))
+                if ious[det, trk] < self.iou_threshold:
+                    break
+                if assigned[det] is not None or trk in matched:
+                    continue
+                matched.add(trk)
+                track = self.tracks[track_ids[trk]]
+                assigned[det] = track
+                track.kalman.update(bboxes[det])
+                track.bbox = bboxes[det, :4].copy()
+                track.hits += 1
+                track.time_since_update = 0
+                track.frames_since_refresh += 1
+        for trk, track_id in enumerate(track_ids):
+            if trk not in matched:
+                self.tracks[track_id].time_since_update += 1
+        for det, track in enumerate(assigned):
+            if track is None:
+                track = FaceTrack(next(self._ids), bboxes[det])
+                self.tracks[track.track_id] = track
+                assigned[det] = track
+
+        removed = [t for t, track in self.tracks.items() if track.time_since_update > self.max_age]
+        for track_id in removed:
+            del self.tracks[track_id]
+        return assigned, removed
+
+    def needs_refresh(self, track: FaceTrack, similarity_threshold: float) -> bool:
+        """
+        True when recognition and attributes have to be recomputed for ``track``: it is new,
+        its last match was too close to the decision threshold, or its cache is ``refresh_interval`` frames old.
+        """
+        if not track.refreshed:
+            return True
+        if abs(track.similarity - similarity_threshold) < self.low_confidence_margin:
+            return True
+        return track.frames_since_refresh >= self.refresh_interval
+
+    @staticmethod
+    def mark_refreshed(track: FaceTrack) -> None:
+        track.refreshed = True
+        track.frames_since_refresh = 0
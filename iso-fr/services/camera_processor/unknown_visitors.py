@@ -0,0 +1,124 @@
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.camera_processor.gallery import l2_normalize
+
+__all__ = [
+    "UnknownVisitorStore",
+]
+
+
+class UnknownVisitorStore:
+    """
+    Online leader clustering of faces that did not match the gallery.
+
+    Every unknown embedding joins the closest visitor centroid when their cosine similarity
+    is at least ``threshold``; otherwise it becomes the leader of a new visitor with the
+    next ``unknown-<n>`` id. Centroids follow their members with a running mean capped
+    at ``max_weight`` samples, so a visitor can drift slowly with pose and lighting.
+
+    Centroids live in one preallocated ``(max_visitors, dim)`` matrix, which is the hard
+    memory cap: visitors unseen for ``ttl`` seconds are expired and, when the matrix is
+    full, the least recently seen visitor is evicted. A sighting opens a new visit when
+    the visitor was unseen for ``visit_gap`` seconds, so callers can log once per visit.
+    The store is separate from the known-person ``FaceGallery`` and never slows it down.
+    """
+
+    def __init__(self, max_visitors: int = 1000, threshold: float = 0.5, ttl: float = 3600.0, visit_gap: float = 300.0,
+                 dim: int = 512, max_weight: int = 20) -> None:
+        self.max_visitors = max(1, max_visitors)
+        self.threshold = threshold
+        self.ttl = ttl
+        self.visit_gap = visit_gap
+        self.max_weight = max(1, max_weight)
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._centroids = np.zeros((self.max_visitors, dim), dtype=np.float32)
+        self._active = np.zeros(self.max_visitors, dtype=bool)
+        self._last_seen = np.zeros(self.max_visitors, dtype=np.float64)
+        self._weights = np.zeros(self.max_visitors, dtype=np.int32)
+        self._ids: List[Optional[str]] = [None] * self.max_visitors
+        self._numbers = itertools.count(1)
+        self.visitors_created = 0
+        self.visits = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._active.sum())
+
+    def _expire(self, now: float) -> None:
+        stale = self._active & (self._last_seen < now - self.ttl)
+        count = int(stale.sum())
+        if count:
+            self._active[stale] = False
+            self.expired += count
+
+    def _free_slot(self) -> int:
+        free = np.flatnonzero(~self._active)
+        if len(free):
+            return int(free[0])
+        slot = int(np.argmin(self._last_seen))
+        self.evicted += 1
+        return slot
+
+    def assign(self, embeddings: np.ndarray, now: Optional[float] = None) -> List[Tuple[str, bool]]:
+        """
+        Cluster a batch of unknown face embeddings.
+
+        :param embeddings: Array of shape (F, D) (or a single D vector).
+        :return: ``(visitor_id, new_visit)`` per face; ``new_visit`` is True on a visitor's
+            first sighting and when they come back after ``visit_gap`` seconds.
+        """
+        queries = l2_normalize(np.atleast_2d(embeddings))
+        results: List[Tuple[str, bool]] = []
+        if queries.shape[0] == 0:
+            return results
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if queries.shape[1] != self.dim:
+                if self._active.any():
+                    raise ValueError(f"Embedding size {queries.shape[1]} does not match the store ({self.dim})")
+                self.dim = queries.shape[1]
+                self._centroids = np.zeros((self.max_visitors, self.dim), dtype=np.float32)
+            self._expire(now)
+            # One matrix multiply for the batch; leaders created below are scored as they appear
+            sims = queries @ self._centroids.T
+            sims[:, ~self._active] = -np.inf
+            for i, query in enumerate(queries):
+                slot = int(np.argmax(sims[i]))
+                if sims[i, slot] >= self.threshold:
+                    new_visit = bool(now - self._last_seen[slot] >= self.visit_gap)
+                    weight = min(int(self._weights[slot]) + 1, self.max_weight)
+                    centroid = self._centroids[slot] + (query - self._centroids[slot]) / weight
+                    self._centroids[slot] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+                    self._weights[slot] = weight
+                else:
+                    slot = self._free_slot()
+                    new_visit = True
+                    self._centroids[slot] = query
+                    self._weights[slot] = 1
+                    self._ids[slot] = f"unknown-{next(self._numbers)}"
+                    self._active[slot] = True
+                    self.visitors_created += 1
+                    sims[i + 1:, slot] = queries[i + 1:] @ query
+                self._last_seen[slot] = now
+                self.visits += new_visit
+                results.append((self._ids[slot], new_visit))
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "visitors": int(self._active.sum()),
+                "capacity": self.max_visitors,
+                "visitors_created": self.visitors_created,
+                "visits": self.visits,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
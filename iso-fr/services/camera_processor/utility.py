@@ -27,7 +27,7 @@ def get_width_height(patch_info):
 def parse_model_name(model_name):
     info = model_name.split('_')[0:-1]
     h_input, w_input = info[-1].split('x')
-    model_type = model_name.split('.pth')[0].split('_')[-1]
+    model_type = os.path.splitext(model_name)[0].split('_')[-1]
 
     if info[0] == "org":
         scale = None